@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+import time
+
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# backend: (одновременных запросов, длина очереди, сколько секунд ждать в очереди)
+ADMISSION_LIMITS = {
+    'posts': (int(os.getenv("POSTS_MAX_CONCURRENCY", "64")), int(os.getenv("POSTS_MAX_QUEUE", "32")),
+              float(os.getenv("POSTS_QUEUE_TIMEOUT", "0.5"))),
+    'stats': (int(os.getenv("STATS_MAX_CONCURRENCY", "32")), int(os.getenv("STATS_MAX_QUEUE", "16")),
+              float(os.getenv("STATS_QUEUE_TIMEOUT", "0.5"))),
+    'user': (int(os.getenv("USER_MAX_CONCURRENCY", "32")), int(os.getenv("USER_MAX_QUEUE", "32")),
+             float(os.getenv("USER_QUEUE_TIMEOUT", "0.5"))),
+}
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a small bounded wait queue; acquire() fails fast once the queue is full."""
+
+    def __init__(self, name, max_concurrency, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def acquire(self):
+        with self._cond:
+            if self.active < self.max_concurrency and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
+
+
+class AsyncAdmissionLimiter(AdmissionLimiter):
+    """Same limits for the asyncio gateway; waiting happens on the event loop instead of a thread."""
+
+    def __init__(self, name, max_concurrency, max_queue, queue_timeout):
+        super().__init__(name, max_concurrency, max_queue, queue_timeout)
+        self._async_cond = None
+
+    async def acquire_async(self):
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            if self.active < self.max_concurrency and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._async_cond.wait_for(lambda: self.active < self.max_concurrency),
+                    self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    async def release_async(self):
+        async with self._async_cond:
+            self.active -= 1
+            self._async_cond.notify()
+
+
+def create_limiters(limiter_class=AdmissionLimiter):
+    return {
+        name: limiter_class(name, max_concurrency, max_queue, queue_timeout)
+        for name, (max_concurrency, max_queue, queue_timeout) in ADMISSION_LIMITS.items()
+    }
+
+def limiters_stats(limiters):
+    return {name: limiter.stats() for name, limiter in limiters.items()}
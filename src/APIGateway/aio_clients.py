@@ -0,0 +1,189 @@
+import asyncio
+import time
+from proto import post_pb2, post_pb2_grpc
+from proto import statistics_pb2 as pb2
+from proto import statistics_pb2_grpc as pb2_grpc
+from grpc_pool import create_aio_pool
+from encoder import post_stats_to_dict, posts_stats_to_list, posts_stats_by_id, dynamics_to_list, top_posts_to_list, top_users_to_list
+from post_client import (
+    POST_SERVICE_ADDR, POST_CHANNEL_POOL_SIZE, MAX_PAGE_SIZE, MAX_PRIVATE_POSTS,
+    post_list_cache, first_public_page, merge_window, list_result, cursor_request, cursor_result,
+    search_request
+)
+from statistics_client import (
+    STATS_SERVICE_ADDR, STATS_CHANNEL_POOL_SIZE, RPC_TIMEOUTS, EMPTY_POST_STATS, STATS_ERRORS,
+    FEED_STATS_TIMEOUT, top_cache, stats_breaker, last_known_good, metric_enum, result_key, empty_posts_stats
+)
+from circuit_breaker import CircuitOpenError
+
+post_aio_pool = create_aio_pool(POST_SERVICE_ADDR, POST_CHANNEL_POOL_SIZE, post_pb2_grpc.PostServiceStub)
+stats_aio_pool = create_aio_pool(STATS_SERVICE_ADDR, STATS_CHANNEL_POOL_SIZE, pb2_grpc.StatisticsServiceStub)
+
+def get_post_client():
+    return post_aio_pool.stub()
+
+async def close_pools():
+    await post_aio_pool.close()
+    await stats_aio_pool.close()
+
+########################## Posts #########################
+async def _public_page(tag, page, page_size):
+    return await post_list_cache.get_async(('tag', tag), (page, page_size), lambda: get_post_client().ListPosts(
+        post_pb2.ListPostsRequest(page=page, page_size=page_size, username='', tag=tag)
+    ))
+
+async def _load_private_posts(username, tag):
+    posts = []
+    page = 1
+    while True:
+        response = await get_post_client().ListPosts(post_pb2.ListPostsRequest(
+            page=page, page_size=MAX_PAGE_SIZE, username=username, tag=tag, private_only=True
+        ))
+        if response.total > MAX_PRIVATE_POSTS:
+            return None
+        posts.extend(response.posts)
+        if page >= response.pages:
+            return posts
+        page += 1
+
+async def _direct_page(username, tag, page, page_size):
+    response = await get_post_client().ListPosts(post_pb2.ListPostsRequest(
+        page=page, page_size=page_size, username=username, tag=tag
+    ))
+    return list(response.posts), response.total
+
+async def _private_posts(username, tag):
+    return await post_list_cache.get_async(('user', username), tag, lambda: _load_private_posts(username, tag))
+
+async def _merge_private_posts(privates, tag, page, page_size):
+    start = (page - 1) * page_size
+    end = start + page_size
+
+    public_page = first_public_page(start, len(privates), page_size)
+    response = await _public_page(tag, public_page, page_size)
+    public_total = response.total
+    if not response.posts and public_total:
+        public_page = (public_total - 1) // page_size + 1
+        response = await _public_page(tag, public_page, page_size)
+
+    offset = (public_page - 1) * page_size
+    window = list(response.posts)
+    while offset + len(window) < min(end, public_total):
+        public_page += 1
+        response = await _public_page(tag, public_page, page_size)
+        if not response.posts:
+            break
+        window.extend(response.posts)
+
+    return merge_window(window, offset, public_total, privates, start, end)
+
+async def list_posts(username, tag, page, page_size):
+    page = max(1, page)
+    page_size = min(MAX_PAGE_SIZE, max(1, page_size))
+
+    privates = await _private_posts(username, tag) if username else []
+    if privates is None:
+        posts, total = await _direct_page(username, tag, page, page_size)
+    elif privates:
+        posts, total = await _merge_private_posts(privates, tag, page, page_size)
+    else:
+        response = await _public_page(tag, page, page_size)
+        posts, total = list(response.posts), response.total
+
+    return list_result(posts, total, page, page_size)
+
+async def list_posts_after(username, tag, cursor, page_size):
+    return cursor_result(await get_post_client().ListPosts(cursor_request(username, tag, cursor, page_size)))
+
+async def search_posts(username, query, cursor, page_size):
+    return cursor_result(await get_post_client().SearchPosts(search_request(username, query, cursor, page_size)))
+
+async def batch_get_posts(username, post_ids):
+    if not post_ids:
+        return post_pb2.BatchGetPostsResponse()
+    return await get_post_client().BatchGetPosts(post_pb2.BatchGetPostsRequest(post_ids=post_ids, username=username))
+
+########################## Statistics #########################
+async def _call(method, request, timeout=None):
+    if not stats_breaker.allow():
+        raise CircuitOpenError("Statistics service circuit is open")
+    # Как и в statistics_client._call: исход записываем и при отмене корутины, и при закрытом пуле
+    started = time.monotonic()
+    success = False
+    try:
+        response = await getattr(stats_aio_pool.stub(), method)(request, timeout=timeout or RPC_TIMEOUTS[method])
+        success = True
+    finally:
+        stats_breaker.record(success, time.monotonic() - started)
+    return response
+
+async def _fetch(method, request, convert, default):
+    key = result_key(method, request)
+    try:
+        result = convert(await _call(method, request))
+    except STATS_ERRORS as e:
+        print(f"Error calling {method}: {e}")
+        return last_known_good.get(key, default)
+    last_known_good.put(key, result)
+    return result
+
+async def get_post_stats(post_id):
+    return await _fetch('GetPostStats', pb2.PostIdRequest(post_id=int(post_id)), post_stats_to_dict, EMPTY_POST_STATS)
+
+async def get_posts_stats(post_ids):
+    request = pb2.PostIdsRequest(post_ids=post_ids)
+    return await _fetch('GetPostsStatsBatch', request, posts_stats_to_list, empty_posts_stats(request.post_ids))
+
+async def get_feed_stats(post_ids):
+    if not post_ids:
+        return {}
+    try:
+        response = await _call('GetPostsStatsBatch', pb2.PostIdsRequest(post_ids=post_ids), timeout=FEED_STATS_TIMEOUT)
+    except STATS_ERRORS as e:
+        print(f"Error getting feed stats: {e}")
+        return None
+    return posts_stats_by_id(response)
+
+async def get_view_dynamics(post_id):
+    return await _fetch('GetViewDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
+
+async def get_like_dynamics(post_id):
+    return await _fetch('GetLikeDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
+
+async def get_comment_dynamics(post_id):
+    return await _fetch('GetCommentDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
+
+async def get_post_dashboard(post_id):
+    stats, views, likes, comments = await asyncio.gather(
+        get_post_stats(post_id),
+        get_view_dynamics(post_id),
+        get_like_dynamics(post_id),
+        get_comment_dynamics(post_id)
+    )
+    return {'post_id': int(post_id), 'stats': stats, 'views': views, 'likes': likes, 'comments': comments}
+
+async def _fetch_top_posts(metric_type):
+    return top_posts_to_list(await _call('GetTopPosts', pb2.TopRequest(metric=metric_enum(metric_type))))
+
+async def _fetch_top_users(metric_type):
+    return top_users_to_list(await _call('GetTopUsers', pb2.TopRequest(metric=metric_enum(metric_type))))
+
+async def get_top_posts(metric_type):
+    key = ('top_posts', metric_type)
+    try:
+        result = await top_cache.get_async(('posts', metric_type), lambda: _fetch_top_posts(metric_type))
+    except STATS_ERRORS as e:
+        print(f"Error getting top posts: {e}")
+        return last_known_good.get(key, [])
+    last_known_good.put(key, result)
+    return result
+
+async def get_top_users(metric_type):
+    key = ('top_users', metric_type)
+    try:
+        result = await top_cache.get_async(('users', metric_type), lambda: _fetch_top_users(metric_type))
+    except STATS_ERRORS as e:
+        print(f"Error getting top users: {e}")
+        return last_known_good.get(key, [])
+    last_known_good.put(key, result)
+    return result
@@ -0,0 +1,394 @@
+"""Asyncio variant of gateway.py: same routes served by Starlette with grpc.aio and httpx clients.
+
+Run with: uvicorn async_gateway:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import functools
+import http.cookiejar
+import grpc
+import httpx
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import parse_etags, parse_date, http_date, quote_etag
+from proto import post_pb2
+import aio_clients
+import auth
+from auth import verify_token, token_cache
+from encoder import dumps, post_to_dict, post_list_to_dict, feed_to_dict, top_posts_with_bodies
+from validators import post_etag, post_last_modified, is_not_modified, parse_post_ids, parse_flag, parse_int
+from post_client import invalidate_created_post, invalidate_post_lists, get_post_list_cache_stats
+from statistics_client import get_top_cache_stats, get_breaker_stats, MAX_STATS_BATCH
+from http_client import (
+    strip_hop_by_hop, USER_POOL_MAXSIZE, USER_CONNECT_TIMEOUT, USER_READ_TIMEOUT, USER_RETRIES
+)
+from admission import AsyncAdmissionLimiter, create_limiters, limiters_stats, RETRY_AFTER
+from kafka_producer import (
+    producer, get_producer_metrics, send_like_event, send_view_event, send_impression_event, send_comment_event
+)
+from metrics import AsgiMetricsMiddleware, CONTENT_TYPE, instrument, observe_call, register_producer, render, timed
+
+SERVICES = {
+    "user": "http://userservice:5001",
+}
+
+http_client = None
+limiters = create_limiters(AsyncAdmissionLimiter)
+
+send_like_event = instrument('kafka', 'like_click_events')(send_like_event)
+send_view_event = instrument('kafka', 'view_events')(send_view_event)
+send_impression_event = instrument('kafka', 'impression_events')(send_impression_event)
+send_comment_event = instrument('kafka', 'comment_events')(send_comment_event)
+producer.add_failure_callback(lambda topic, event, exc: observe_call('kafka', topic, True, None))
+register_producer(producer)
+
+def json_response(obj, status=200):
+    with timed('encoder', 'json'):
+        body = dumps(obj)
+    return Response(body, status_code=status, media_type='application/json')
+
+def emit(func, *args):
+    # send() почти всегда не блокирует, но первое подключение к Kafka может, поэтому уводим в пул потоков
+    asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+def admit(backend, handler):
+    limiter = limiters[backend]
+
+    async def wrapper(request):
+        if not await limiter.acquire_async():
+            response = json_response({"message": f"Service overloaded: {backend}"}, 503)
+            response.headers['Retry-After'] = str(RETRY_AFTER)
+            return response
+        try:
+            return await handler(request)
+        finally:
+            await limiter.release_async()
+    return wrapper
+
+async def list_posts_from_params(username, params):
+    tag = params.get('tag', '')
+    page_size = parse_int(params.get('page_size'), 10)
+    if 'cursor' in params:
+        return await aio_clients.list_posts_after(username, tag, params['cursor'], page_size)
+    return await aio_clients.list_posts(username, tag, parse_int(params.get('page'), 1), page_size)
+
+def get_user_from_token(request):
+    with timed('auth', 'verify_token'):
+        current_user, message, code = verify_token(request.cookies.get("jwt"))
+    if code != 200:
+        return json_response({"message": message}, code), code
+    return current_user, 200
+
+async def startup():
+    global http_client
+    auth.init_public_key()
+    limits = httpx.Limits(max_connections=USER_POOL_MAXSIZE, max_keepalive_connections=USER_POOL_MAXSIZE)
+    http_client = httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(retries=USER_RETRIES, limits=limits),
+        timeout=httpx.Timeout(USER_READ_TIMEOUT, connect=USER_CONNECT_TIMEOUT),
+        follow_redirects=False,
+        # Клиент общий для всех запросов: Set-Cookie от UserService не сохраняем,
+        # иначе jwt после /user/login уйдёт в запросы других пользователей без куки
+        cookies=http.cookiejar.CookieJar(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    )
+
+async def shutdown():
+    await http_client.aclose()
+    await aio_clients.close_pools()
+
+########################## User service routes ##########################
+async def handle_user_request(request):
+    url = f"{SERVICES['user']}{request.url.path}"
+    headers = strip_hop_by_hop((key, value) for (key, value) in request.headers.items() if key.lower() != 'host')
+    upstream = http_client.build_request(
+        request.method,
+        url,
+        headers=headers,
+        content=await request.body()
+    )
+    with timed('UserService', request.url.path):
+        res = await http_client.send(upstream, stream=True)
+
+    response = StreamingResponse(res.aiter_raw(), status_code=res.status_code, background=BackgroundTask(res.aclose))
+    # raw_headers сохраняет повторяющиеся заголовки (несколько Set-Cookie)
+    response.raw_headers = [
+        (name.encode('latin-1'), value.encode('latin-1'))
+        for name, value in strip_hop_by_hop(res.headers.multi_items())
+    ]
+    return response
+
+########################## Posts service routes #########################
+async def handle_post_request(request):
+    post_id = request.path_params.get('post_id')
+    try:
+        client = aio_clients.get_post_client()
+        current_user_or_error, code = get_user_from_token(request)
+        if code != 200:
+            return current_user_or_error
+        username = current_user_or_error
+
+        # GET list
+        if request.method == 'GET' and not post_id:
+            result = await list_posts_from_params(username, request.query_params)
+            emit(send_impression_event, username, [post.id for post in result['posts']])
+            return json_response(post_list_to_dict(result))
+
+        # GET one
+        elif request.method == 'GET':
+            if_none_match = parse_etags(request.headers.get('if-none-match'))
+            if_modified_since = parse_date(request.headers.get('if-modified-since'))
+            if if_none_match or if_modified_since:
+                version = await client.GetPostVersion(post_pb2.GetPostRequest(
+                    post_id=int(post_id), username=username
+                ))
+                etag = post_etag(version.id, version.updated_at)
+                last_modified = post_last_modified(version.updated_at)
+                if is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+                    emit(send_view_event, username, version.id)
+                    return Response(status_code=304, headers={
+                        'ETag': quote_etag(etag),
+                        'Last-Modified': http_date(last_modified)
+                    })
+
+            response = await client.GetPost(post_pb2.GetPostRequest(
+                post_id=int(post_id), username=username
+            ))
+            emit(send_view_event, username, response.post.id)
+            result = json_response(post_to_dict(response.post))
+            result.headers['ETag'] = quote_etag(post_etag(response.post.id, response.post.updated_at))
+            result.headers['Last-Modified'] = http_date(post_last_modified(response.post.updated_at))
+            return result
+
+        # POST - create
+        elif request.method == 'POST':
+            data = await request.json()
+            response = await client.CreatePost(post_pb2.CreatePostRequest(
+                title=data.get('title', ''),
+                description=data.get('description', ''),
+                username=username,
+                is_private=data.get('is_private', False),
+                tags=data.get('tags', [])
+            ))
+            invalidate_created_post(response.post)
+            return json_response(post_to_dict(response.post), 201)
+
+        # PUT - update
+        elif request.method == 'PUT':
+            data = await request.json()
+            response = await client.UpdatePost(post_pb2.UpdatePostRequest(
+                post_id=int(post_id),
+                username=username,
+                title=data.get('title', ''),
+                description=data.get('description', ''),
+                is_private=data.get('is_private', False),
+                tags=data.get('tags', [])
+            ))
+            invalidate_post_lists()
+            return json_response(post_to_dict(response.post))
+
+        # DELETE
+        elif request.method == 'DELETE':
+            response = await client.DeletePost(post_pb2.DeletePostRequest(
+                post_id=int(post_id), username=username
+            ))
+            invalidate_post_lists()
+            return json_response({'success': response.success, 'message': response.message})
+    except Exception:
+        return json_response({"message": "Error in rpc"}, 400)
+
+async def search_posts_request(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+    username = current_user_or_error
+
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return json_response({'error': 'Missing search query q'}, 400)
+
+    try:
+        result = await aio_clients.search_posts(
+            username, query, request.query_params.get('cursor', ''), parse_int(request.query_params.get('page_size'), 10)
+        )
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            return json_response({'error': e.details()}, 400)
+        return json_response({"message": "Error in rpc"}, 400)
+
+    emit(send_impression_event, username, [post.id for post in result['posts']])
+    return json_response(post_list_to_dict(result))
+
+
+async def handle_like_request(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+    username = current_user_or_error
+
+    if request.method == 'POST':
+        emit(send_like_event, username, request.path_params['post_id'])
+
+    return json_response({"message": "Success"})
+
+async def handle_comment_request(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+    username = current_user_or_error
+
+    if request.method == 'POST':
+        emit(send_comment_event, username, request.path_params['post_id'], "comment_id_placeholder")
+
+    return json_response({"message": "Success"})
+
+########################## Stats service routes #########################
+async def get_post_statistics(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+
+    stats = await aio_clients.get_post_stats(request.path_params['post_id'])
+    return json_response(stats)
+
+async def get_posts_statistics(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+
+    try:
+        post_ids = parse_post_ids(request.query_params.getlist('ids'), MAX_STATS_BATCH)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    return json_response({'stats': await aio_clients.get_posts_stats(post_ids)})
+
+def dynamics_route(fetch):
+    async def handler(request):
+        current_user_or_error, code = get_user_from_token(request)
+        if code != 200:
+            return current_user_or_error
+
+        post_id = request.path_params['post_id']
+        dynamics = await fetch(post_id)
+        return json_response({'post_id': post_id, 'dynamics': dynamics})
+    return handler
+
+async def get_post_dashboard_stats(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+
+    dashboard = await aio_clients.get_post_dashboard(request.path_params['post_id'])
+    return json_response(dashboard)
+
+def top_route(fetch, key):
+    async def handler(request):
+        current_user_or_error, code = get_user_from_token(request)
+        if code != 200:
+            return current_user_or_error
+
+        metric = request.query_params.get('metric', 'view')
+        if metric not in ['view', 'like', 'comment']:
+            return json_response({'error': 'Invalid metric. Use "view", "like" or "comment"'}, 400)
+
+        top = await fetch(metric)
+        return json_response({'metric': metric, key: top})
+    return handler
+
+async def get_top_posts_stats(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+
+    metric = request.query_params.get('metric', 'view')
+    if metric not in ['view', 'like', 'comment']:
+        return json_response({'error': 'Invalid metric. Use "view", "like" or "comment"'}, 400)
+
+    top_posts = await aio_clients.get_top_posts(metric)
+    if not parse_flag(request.query_params.get('with_posts')):
+        return json_response({'metric': metric, 'top_posts': top_posts})
+
+    try:
+        posts = await aio_clients.batch_get_posts(current_user_or_error, [entry['post_id'] for entry in top_posts])
+    except grpc.RpcError as e:
+        print(f"Error getting top posts bodies: {e}")
+        posts = None
+    return json_response({'metric': metric, **top_posts_with_bodies(top_posts, posts)})
+
+########################## Feed routes #########################
+async def get_feed(request):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return current_user_or_error
+    username = current_user_or_error
+
+    try:
+        result = await list_posts_from_params(username, request.query_params)
+    except grpc.RpcError:
+        return json_response({"message": "Error in rpc"}, 400)
+
+    post_ids = [post.id for post in result['posts']]
+    emit(send_impression_event, username, post_ids)
+    return json_response(feed_to_dict(result, await aio_clients.get_feed_stats(post_ids)))
+
+########################## Internal routes #########################
+async def get_token_cache_stats(request):
+    return json_response(token_cache.stats())
+
+async def get_post_list_cache_statistics(request):
+    return json_response(get_post_list_cache_stats())
+
+async def get_admission_statistics(request):
+    return json_response(limiters_stats(limiters))
+
+async def get_circuit_breaker_statistics(request):
+    return json_response({'stats': get_breaker_stats()})
+
+async def get_top_cache_statistics(request):
+    return json_response(get_top_cache_stats())
+
+async def get_kafka_producer_statistics(request):
+    return json_response(get_producer_metrics())
+
+async def get_metrics(request):
+    return Response(render(), headers={'Content-Type': CONTENT_TYPE})
+
+
+routes = [
+    Route('/internal/token_cache', get_token_cache_stats, methods=['GET']),
+    Route('/user/change_profile', admit('user', handle_user_request), methods=['PUT']),
+    Route('/user/myprofile', admit('user', handle_user_request), methods=['GET']),
+    Route('/user/signup', admit('user', handle_user_request), methods=['POST']),
+    Route('/user/login', admit('user', handle_user_request), methods=['POST']),
+    Route('/user/whoami', admit('user', handle_user_request), methods=['GET']),
+    Route('/posts', admit('posts', handle_post_request), methods=['GET', 'POST']),
+    # до /posts/{post_id}: Starlette берёт первый подходящий маршрут
+    Route('/posts/search', admit('posts', search_posts_request), methods=['GET']),
+    Route('/posts/{post_id}', admit('posts', handle_post_request), methods=['GET', 'PUT', 'DELETE']),
+    Route('/feed', admit('posts', get_feed), methods=['GET']),
+    Route('/like/{post_id}', handle_like_request, methods=['GET', 'POST']),
+    Route('/comment/{post_id}', handle_comment_request, methods=['GET', 'POST']),
+    Route('/stats/post/{post_id}', admit('stats', get_post_statistics), methods=['GET']),
+    Route('/stats/posts', admit('stats', get_posts_statistics), methods=['GET']),
+    Route('/stats/post/{post_id}/views', admit('stats', dynamics_route(aio_clients.get_view_dynamics)), methods=['GET']),
+    Route('/stats/post/{post_id}/likes', admit('stats', dynamics_route(aio_clients.get_like_dynamics)), methods=['GET']),
+    Route('/stats/post/{post_id}/comments', admit('stats', dynamics_route(aio_clients.get_comment_dynamics)), methods=['GET']),
+    Route('/stats/post/{post_id}/dashboard', admit('stats', get_post_dashboard_stats), methods=['GET']),
+    Route('/stats/top/posts', admit('stats', get_top_posts_stats), methods=['GET']),
+    Route('/stats/top/users', admit('stats', top_route(aio_clients.get_top_users, 'top_users')), methods=['GET']),
+    Route('/internal/post_list_cache', get_post_list_cache_statistics, methods=['GET']),
+    Route('/internal/admission', get_admission_statistics, methods=['GET']),
+    Route('/internal/circuit_breakers', get_circuit_breaker_statistics, methods=['GET']),
+    Route('/internal/top_cache', get_top_cache_statistics, methods=['GET']),
+    Route('/internal/kafka_producer', get_kafka_producer_statistics, methods=['GET']),
+    Route('/metrics', get_metrics, methods=['GET']),
+]
+
+app = Starlette(routes=routes, on_startup=[startup], on_shutdown=[shutdown])
+app.add_middleware(AsgiMetricsMiddleware, routes=routes)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,40 @@
+import os
+import jwt
+from cryptography.hazmat.primitives import serialization
+from token_cache import TokenCache
+
+PUBLIC_KEY_PATH = os.getenv("PUBLIC_KEY_PATH", "signature.pub")
+
+public_key = None
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+
+def load_public_key(path=PUBLIC_KEY_PATH):
+    with open(path, "rb") as public_file:
+        return serialization.load_pem_public_key(public_file.read())
+
+def init_public_key(path=PUBLIC_KEY_PATH):
+    global public_key
+    public_key = load_public_key(path)
+    return public_key
+
+def verify_token(token):
+    """Returns (username, message, code); message is set only when code != 200."""
+    if not token:
+        return None, "Unauthorized: Missing token", 401
+
+    current_user = token_cache.get(token)
+    if current_user:
+        return current_user, None, 200
+
+    try:
+        data = jwt.decode(token, public_key, algorithms=["RS256"])
+        current_user = data["username"]
+        if not current_user:
+            return None, "No such user", 400
+        if "exp" in data:
+            token_cache.put(token, current_user, data["exp"])
+    except jwt.ExpiredSignatureError:
+        return None, "Token has expired", 401
+    except jwt.InvalidTokenError:
+        return None, "Invalid token", 400
+    return current_user, None, 200
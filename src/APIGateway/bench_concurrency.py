@@ -0,0 +1,64 @@
+"""Concurrency benchmark for the Flask (gateway.py) and asyncio (async_gateway.py) gateways.
+
+Start both servers, e.g.
+    python gateway.py                                      # :5000
+    uvicorn async_gateway:app --host 0.0.0.0 --port 5010   # :5010
+then run
+    python bench_concurrency.py --jwt <token> http://localhost:5000/posts http://localhost:5010/posts
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+async def run_level(url, cookies, concurrency, requests_per_worker):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60, cookies=cookies) as client:
+        async def worker():
+            nonlocal errors
+            for _ in range(requests_per_worker):
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'errors': errors
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Gateway concurrency benchmark")
+    parser.add_argument("urls", nargs="+", help="Endpoints to compare")
+    parser.add_argument("--jwt", default="", help="Value of the jwt cookie")
+    parser.add_argument("--levels", default="1,10,100,500,1000", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per worker")
+    args = parser.parse_args()
+
+    cookies = {"jwt": args.jwt} if args.jwt else {}
+    levels = [int(level) for level in args.levels.split(',')]
+
+    for url in args.urls:
+        print(url)
+        print(f"{'concurrency':>12} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+        for level in levels:
+            result = await run_level(url, cookies, level, args.requests)
+            print(f"{level:>12} {result['rps']:>10.1f} {result['p50']:>10.1f} {result['p99']:>10.1f} {result['errors']:>8}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
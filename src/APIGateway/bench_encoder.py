@@ -0,0 +1,72 @@
+"""Micro-benchmark: post_to_dict + Flask jsonify vs encoder.json_response for a ListPosts page.
+
+Run inside the gateway image: python bench_encoder.py [page_size] [iterations]
+"""
+import sys
+import timeit
+from flask import Flask, jsonify
+from proto import post_pb2
+import encoder
+
+def make_page(page_size):
+    posts = [
+        post_pb2.Post(
+            id=i,
+            title=f"Post title {i}",
+            description="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            username=f"user{i % 17}",
+            created_at="2025-04-01T12:34:56.789012",
+            updated_at="2025-04-02T08:00:00.000001",
+            is_private=bool(i % 5 == 0),
+            tags=["news", "python", f"tag{i % 7}"]
+        )
+        for i in range(page_size)
+    ]
+    return post_pb2.ListPostsResponse(posts=posts, total=1000, page=1, page_size=page_size, pages=1000 // page_size)
+
+def legacy_post_to_dict(post):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'description': post.description,
+        'username': post.username,
+        'created_at': post.created_at,
+        'updated_at': post.updated_at,
+        'is_private': post.is_private,
+        'tags': list(post.tags)
+    }
+
+def main():
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    response = make_page(page_size)
+    app = Flask("bench")
+
+    def legacy():
+        return jsonify({
+            'posts': [legacy_post_to_dict(post) for post in response.posts],
+            'total': response.total,
+            'page': response.page,
+            'pages': response.pages
+        }).get_data()
+
+    def fast():
+        return encoder.json_response({
+            'posts': encoder.posts_to_list(response.posts),
+            'total': response.total,
+            'page': response.page,
+            'pages': response.pages
+        }).get_data()
+
+    with app.app_context():
+        print(f"page_size={page_size} iterations={iterations} orjson={'yes' if encoder.orjson else 'no'}")
+        results = {}
+        for name, func in (("post_to_dict + jsonify", legacy), ("encoder.json_response", fast)):
+            seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+            results[name] = seconds
+            print(f"{name:<24} {seconds / iterations * 1e6:9.1f} us/page")
+        legacy_time, fast_time = results.values()
+        print(f"speedup: {legacy_time / fast_time:.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Result cache that serves stale values while a single background refresh runs."""
+
+    def __init__(self, ttl, stale_ttl):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._async_key_locks = {}
+        self._refreshing = set()
+        self._tasks = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _async_key_lock(self, key):
+        with self._lock:
+            return self._async_key_locks.setdefault(key, asyncio.Lock())
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def _lookup(self, key, count_miss=False):
+        """Returns (found, value, needs_refresh)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if now < expires_at:
+                    self.hits += 1
+                    return True, value, False
+                if now < expires_at + self.stale_ttl and not count_miss:
+                    self.stale_hits += 1
+                    needs_refresh = key not in self._refreshing
+                    if needs_refresh:
+                        self._refreshing.add(key)
+                        self.refreshes += 1
+                    return True, value, needs_refresh
+            if count_miss:
+                self.misses += 1
+            return False, None, False
+
+    def _refresh_failed(self, key, e):
+        with self._lock:
+            self.refresh_errors += 1
+        print(f"Error refreshing cache entry {key}: {e}")
+
+    def _refresh_done(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            self._refresh_failed(key, e)
+        finally:
+            self._refresh_done(key)
+
+    async def _refresh_async(self, key, loader):
+        try:
+            self._store(key, await loader())
+        except Exception as e:
+            self._refresh_failed(key, e)
+        finally:
+            self._refresh_done(key)
+
+    def get(self, key, loader):
+        found, value, needs_refresh = self._lookup(key)
+        if needs_refresh:
+            threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+        if found:
+            return value
+
+        # Холодный промах: грузит один поток, остальные ждут его результат
+        with self._key_lock(key):
+            found, value, _ = self._lookup(key, count_miss=True)
+            if found:
+                return value
+            value = loader()
+            self._store(key, value)
+            return value
+
+    async def get_async(self, key, loader):
+        """Same as get() for the asyncio gateway; loader is a coroutine function."""
+        found, value, needs_refresh = self._lookup(key)
+        if needs_refresh:
+            task = asyncio.get_running_loop().create_task(self._refresh_async(key, loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if found:
+            return value
+
+        async with self._async_key_lock(key):
+            found, value, _ = self._lookup(key, count_miss=True)
+            if found:
+                return value
+            value = await loader()
+            self._store(key, value)
+            return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors
+            }
+
+
+class LocalVersions:
+    """Namespace versions of a single process."""
+
+    def __init__(self):
+        self._versions = {}
+        self._generation = 0
+
+    def get(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def generation(self):
+        return self._generation
+
+    def bump(self, namespaces):
+        for namespace in namespaces:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def bump_all(self):
+        self._generation += 1
+
+
+class SharedVersions:
+    """Namespace versions in a file mapped by every gunicorn worker: a bump in one worker invalidates all of them.
+
+    Namespaces are hashed into a fixed number of slots; a collision only causes an extra miss.
+    Slot 0 is the generation bumped by bump_all().
+    """
+
+    def __init__(self, path, slots=4096):
+        self.slots = slots
+        size = (slots + 1) * 8
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Старые значения в файле не мешают: версии только сравниваются на равенство
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _offset(self, namespace):
+        # hash() в разных процессах может отличаться, crc32 — нет
+        return (1 + zlib.crc32(repr(namespace).encode('utf-8')) % self.slots) * 8
+
+    def _read(self, offset):
+        return struct.unpack_from('<Q', self._map, offset)[0]
+
+    def get(self, namespace):
+        return self._read(self._offset(namespace))
+
+    def generation(self):
+        return self._read(0)
+
+    def _increment(self, offsets):
+        # Между процессами read-modify-write сериализуется flock на файле
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for offset in set(offsets):
+                struct.pack_into('<Q', self._map, offset, self._read(offset) + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def bump(self, namespaces):
+        self._increment([self._offset(namespace) for namespace in namespaces])
+
+    def bump_all(self):
+        self._increment([0])
+
+
+class VersionedCache:
+    """Bounded LRU with TTL; keys live in namespaces that are invalidated by bumping a version counter."""
+
+    def __init__(self, ttl, maxsize, versions=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = versions if versions is not None else LocalVersions()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _full_key(self, namespace, key):
+        return (self._versions.generation(), namespace, self._versions.get(namespace), key)
+
+    def _lookup(self, namespace, key):
+        with self._lock:
+            full_key = self._full_key(namespace, key)
+            entry = self._entries.get(full_key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return full_key, True, entry[0]
+            self.misses += 1
+            return full_key, False, None
+
+    def _store(self, full_key, value):
+        with self._lock:
+            # если namespace инвалидировали во время загрузки, значение ляжет под старый ключ и не будет прочитано
+            self._entries[full_key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, namespace, key, loader):
+        full_key, found, value = self._lookup(namespace, key)
+        if found:
+            return value
+        value = loader()
+        self._store(full_key, value)
+        return value
+
+    async def get_async(self, namespace, key, loader):
+        full_key, found, value = self._lookup(namespace, key)
+        if found:
+            return value
+        value = await loader()
+        self._store(full_key, value)
+        return value
+
+    def bump(self, *namespaces):
+        with self._lock:
+            self._versions.bump(namespaces)
+
+    def bump_all(self):
+        with self._lock:
+            self._versions.bump_all()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens on error rate or slow-call rate over a rolling time window, probes with a few calls when half-open."""
+
+    def __init__(self, name, window=30.0, min_calls=10, failure_rate=0.5, slow_call_duration=1.0,
+                 slow_call_rate=0.8, open_timeout=10.0, half_open_calls=3):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_timeout = open_timeout
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _trim(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.opened += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self._calls.clear()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                if now - self._opened_at < self.open_timeout:
+                    self.rejected += 1
+                    return False
+                self._state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, success, duration):
+        slow = duration >= self.slow_call_duration
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes_in_flight -= 1
+                if not success or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+            if self._state == OPEN:
+                return
+
+            self._calls.append((now, not success, slow))
+            self._trim(now)
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                self._open(now)
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            total = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            return {
+                'name': self.name,
+                'state': state,
+                'window_calls': total,
+                'window_failures': failures,
+                'window_slow_calls': slow_calls,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+
+class LastKnownGood:
+    """Bounded LRU of the last successful result per key, served while the circuit is open."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.served = 0
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key, default):
+        with self._lock:
+            if key in self._entries:
+                self.served += 1
+                return self._entries[key]
+            return default
@@ -0,0 +1,85 @@
+import json
+from flask import Response
+from metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _json_encoder.encode(obj).encode('utf-8')
+
+def json_response(obj, status=200):
+    with timed('encoder', 'json'):
+        body = dumps(obj)
+    return Response(body, status=status, mimetype='application/json')
+
+########################## Proto -> JSON-ready objects #########################
+def post_to_dict(post):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'description': post.description,
+        'username': post.username,
+        'created_at': post.created_at,
+        'updated_at': post.updated_at,
+        'is_private': post.is_private,
+        'tags': list(post.tags)
+    }
+
+def posts_to_list(posts):
+    return [post_to_dict(post) for post in posts]
+
+def post_stats_to_dict(response):
+    return {
+        'views': response.views,
+        'likes': response.likes,
+        'comments': response.comments
+    }
+
+def posts_stats_to_list(response):
+    return [
+        {'post_id': stats.post_id, 'views': stats.views, 'likes': stats.likes, 'comments': stats.comments}
+        for stats in response.stats
+    ]
+
+def posts_stats_by_id(response):
+    return {
+        stats.post_id: {'views': stats.views, 'likes': stats.likes, 'comments': stats.comments}
+        for stats in response.stats
+    }
+
+def post_list_to_dict(result):
+    # Страничный результат: total/page/pages, keyset: next_cursor
+    response = {key: value for key, value in result.items() if key != 'page_size'}
+    response['posts'] = posts_to_list(result['posts'])
+    return response
+
+def feed_to_dict(result, stats):
+    # stats is None когда StatisticsService не ответил вовремя: посты отдаём без счётчиков
+    feed = post_list_to_dict(result)
+    for post in feed['posts']:
+        post['stats'] = stats.get(post['id']) if stats is not None else None
+    feed['stats_available'] = stats is not None
+    return feed
+
+def dynamics_to_list(response):
+    return [{'date': day.date, 'count': day.count} for day in response.data]
+
+def top_posts_to_list(response):
+    return [{'post_id': int(post.post_id), 'count': post.count} for post in response.top_posts]
+
+def top_posts_with_bodies(top_posts, response):
+    # response is None когда PostService не ответил: топ отдаём без тел постов.
+    # Записи копируются — top_posts лежат в top_cache
+    posts = {post.id: post_to_dict(post) for post in response.posts} if response is not None else {}
+    top = [dict(entry, post=posts.get(entry['post_id'])) for entry in top_posts]
+    return {'top_posts': top, 'posts_available': response is not None}
+
+def top_users_to_list(response):
+    return [{'user_id': user.user_id, 'count': user.count} for user in response.top_users]
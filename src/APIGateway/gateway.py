@@ -1,13 +1,36 @@
-from flask import Flask, request, jsonify, make_response, Response
-import requests
-import jwt
+import functools
 import grpc
-from proto import post_pb2, post_pb2_grpc
-from kafka_producer import send_like_event, send_view_event, send_comment_event
+from flask import Flask, request, jsonify, make_response, Response
+from proto import post_pb2
+from post_client import (
+    get_post_client, list_posts, list_posts_after, search_posts, batch_get_posts, invalidate_created_post,
+    invalidate_post_lists, get_post_list_cache_stats
+)
+from http_client import (
+    http_session, strip_hop_by_hop, stream_body, USER_CONNECT_TIMEOUT, USER_READ_TIMEOUT
+)
+from kafka_producer import (
+    producer, get_producer_metrics, send_like_event, send_view_event, send_impression_event, send_comment_event
+)
+import auth
+from auth import verify_token, token_cache
+from encoder import json_response, post_to_dict, post_list_to_dict, feed_to_dict, top_posts_with_bodies
+from validators import post_etag, post_last_modified, is_not_modified, parse_post_ids, parse_flag
+from admission import create_limiters, limiters_stats, RETRY_AFTER
+from metrics import init_flask, instrument, observe_call, register_producer, timed
 
 app = Flask("proxy_service")
+init_flask(app)
+
+# send() только ставит событие в очередь продюсера, ошибки доставки приходят в callback
+send_like_event = instrument('kafka', 'like_click_events')(send_like_event)
+send_view_event = instrument('kafka', 'view_events')(send_view_event)
+send_impression_event = instrument('kafka', 'impression_events')(send_impression_event)
+send_comment_event = instrument('kafka', 'comment_events')(send_comment_event)
+producer.add_failure_callback(lambda topic, event, exc: observe_call('kafka', topic, True, None))
+register_producer(producer)
 
-public_key = None
+limiters = create_limiters()
 
 SERVICES = {
     "user": "http://userservice:5001",
@@ -16,20 +39,37 @@ SERVICES = {
 }
 
 def get_user_from_token(request):
-    token = request.cookies.get("jwt")
-    if not token:
-        return jsonify({"message": "Unauthorized: Missing token"}), 401
-    try:
-        data = jwt.decode(token, public_key, algorithms=["RS256"])
-        current_user = data["username"]
-        if not current_user:
-            return jsonify({"message": "No such user"}), 400
-    except jwt.ExpiredSignatureError:
-        return jsonify({"message": "Token has expired"}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({"message": "Invalid token"}), 400
+    with timed('auth', 'verify_token'):
+        current_user, message, code = verify_token(request.cookies.get("jwt"))
+    if code != 200:
+        return jsonify({"message": message}), code
     return current_user, 200
 
+def admit(backend):
+    limiter = limiters[backend]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not limiter.acquire():
+                response = jsonify({"message": f"Service overloaded: {backend}"})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(RETRY_AFTER)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
+
+def list_posts_from_args(username, args):
+    tag = args.get('tag', '')
+    page_size = args.get('page_size', 10, type=int)
+    if 'cursor' in args:
+        return list_posts_after(username, tag, args['cursor'], page_size)
+    return list_posts(username, tag, args.get('page', 1, type=int), page_size)
+
 def proxy_request(service_prefix):
     service_url = SERVICES.get(service_prefix)
 
@@ -45,49 +85,44 @@ def proxy_request(service_prefix):
         current_user = current_user_or_error
 
     url = f"{service_url}{request.path}"
-    res = requests.request(
-        method=request.method,
-        url=url,
-        headers={key: value for (key, value) in request.headers if key != 'Host'},
-        data=request.get_data(),
-        cookies=request.cookies,
-        allow_redirects=False)
-
-    headers = [(name, value) for name, value in res.headers.items()]
-    response = Response(res.content, res.status_code, headers)
+    headers = strip_hop_by_hop((key, value) for (key, value) in request.headers if key != 'Host')
+    with timed('UserService', request.url_rule.rule):
+        res = http_session.request(
+            method=request.method,
+            url=url,
+            headers=dict(headers),
+            data=request.get_data(),
+            allow_redirects=False,
+            stream=True,
+            timeout=(USER_CONNECT_TIMEOUT, USER_READ_TIMEOUT))
+
+    # raw.headers сохраняет повторяющиеся заголовки (несколько Set-Cookie)
+    headers = strip_hop_by_hop(res.raw.headers.items())
+    response = Response(stream_body(res), res.status_code, headers)
+    response.call_on_close(res.close)
     return response
 
+@app.route('/internal/token_cache', methods=['GET'])
+def get_token_cache_stats():
+    return jsonify(token_cache.stats())
+
 ########################## User service routes ##########################
 @app.route('/user/change_profile', methods=['PUT'])
 @app.route('/user/myprofile', methods=['GET'])
 @app.route('/user/signup', methods=['POST'])
 @app.route('/user/login', methods=['POST'])
 @app.route('/user/whoami', methods=['GET'])
+@admit('user')
 def handle_user_request():
     return proxy_request("user")
 
 ########################## Posts service routes #########################
-def grpc_post_client():
-    channel = grpc.insecure_channel('post_service:50051')
-    return post_pb2_grpc.PostServiceStub(channel)
-
-def post_to_dict(post):
-    return {
-        'id': post.id,
-        'title': post.title,
-        'description': post.description,
-        'username': post.username,
-        'created_at': post.created_at,
-        'updated_at': post.updated_at,
-        'is_private': post.is_private,
-        'tags': list(post.tags)
-    }
-
 @app.route('/posts', methods=['GET', 'POST'])
 @app.route('/posts/<post_id>', methods=['GET', 'PUT', 'DELETE'])
+@admit('posts')
 def handle_post_request(post_id=None):
     try:
-        client = grpc_post_client()
+        client = get_post_client()
         current_user_or_error, code = get_user_from_token(request)
         if code != 200:
             return make_response(current_user_or_error, code)
@@ -95,28 +130,33 @@ def handle_post_request(post_id=None):
 
         # GET list
         if request.method == 'GET' and not post_id:
-            page = request.args.get('page', 1, type=int)
-            page_size = request.args.get('page_size', 10, type=int)
-            tag = request.args.get('tag', '')
-            response = client.ListPosts(post_pb2.ListPostsRequest(
-                page=page, page_size=page_size, username=username, tag=tag
-            ))
-            for post in response.posts:
-                send_view_event(username, post.id)
-            return jsonify({
-                'posts': [post_to_dict(post) for post in response.posts],
-                'total': response.total,
-                'page': response.page,
-                'pages': response.pages
-            })
+            result = list_posts_from_args(username, request.args)
+            send_impression_event(username, [post.id for post in result['posts']])
+            return json_response(post_list_to_dict(result))
 
         # GET one
         elif request.method == 'GET':
+            if request.if_none_match or request.if_modified_since:
+                version = client.GetPostVersion(post_pb2.GetPostRequest(
+                    post_id=int(post_id), username=username
+                ))
+                etag = post_etag(version.id, version.updated_at)
+                last_modified = post_last_modified(version.updated_at)
+                if is_not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+                    send_view_event(username, version.id)
+                    response = make_response('', 304)
+                    response.set_etag(etag)
+                    response.last_modified = last_modified
+                    return response
+
             response = client.GetPost(post_pb2.GetPostRequest(
                 post_id=int(post_id), username=username
             ))
             send_view_event(username, response.post.id)
-            return jsonify(post_to_dict(response.post))
+            result = json_response(post_to_dict(response.post))
+            result.set_etag(post_etag(response.post.id, response.post.updated_at))
+            result.last_modified = post_last_modified(response.post.updated_at)
+            return result
 
         # POST - create
         elif request.method == 'POST':
@@ -128,7 +168,8 @@ def handle_post_request(post_id=None):
                 is_private=data.get('is_private', False),
                 tags=data.get('tags', [])
             ))
-            return jsonify(post_to_dict(response.post)), 201
+            invalidate_created_post(response.post)
+            return json_response(post_to_dict(response.post), 201)
 
         # PUT - update
         elif request.method == 'PUT':
@@ -141,17 +182,43 @@ def handle_post_request(post_id=None):
                 is_private=data.get('is_private', False),
                 tags=data.get('tags', [])
             ))
-            return jsonify(post_to_dict(response.post))
+            invalidate_post_lists()
+            return json_response(post_to_dict(response.post))
 
         # DELETE
         elif request.method == 'DELETE':
             response = client.DeletePost(post_pb2.DeletePostRequest(
                 post_id=int(post_id), username=username
             ))
+            invalidate_post_lists()
             return jsonify({'success': response.success, 'message': response.message})
     except:
         return jsonify({"message": "Error in rpc"}), 400
 
+@app.route('/posts/search', methods=['GET'])
+@admit('posts')
+def search_posts_request():
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return make_response(current_user_or_error, code)
+    username = current_user_or_error
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query q'}), 400
+
+    try:
+        result = search_posts(
+            username, query, request.args.get('cursor', ''), request.args.get('page_size', 10, type=int)
+        )
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            return jsonify({'error': e.details()}), 400
+        return jsonify({"message": "Error in rpc"}), 400
+
+    send_impression_event(username, [post.id for post in result['posts']])
+    return json_response(post_list_to_dict(result))
+
 
 @app.route('/like/<post_id>', methods=['GET', 'POST'])
 def handle_like_request(post_id=None):
@@ -180,47 +247,77 @@ def handle_comment_request(post_id=None):
 
 ########################## Stats service routes #########################
 from statistics_client import (
-    get_post_stats, get_view_dynamics, get_like_dynamics, 
-    get_comment_dynamics, get_top_posts, get_top_users
+    get_post_stats, get_posts_stats, get_view_dynamics, get_like_dynamics,
+    get_comment_dynamics, get_post_dashboard, get_top_posts, get_top_users,
+    get_feed_stats, get_top_cache_stats, get_breaker_stats, MAX_STATS_BATCH
 )
 
 @app.route('/stats/post/<post_id>', methods=['GET'])
+@admit('stats')
 def get_post_statistics(post_id):
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
         return make_response(current_user_or_error, code)
 
     stats = get_post_stats(post_id)
-    return jsonify(stats)
+    return json_response(stats)
+
+@app.route('/stats/posts', methods=['GET'])
+@admit('stats')
+def get_posts_statistics():
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return make_response(current_user_or_error, code)
+
+    try:
+        post_ids = parse_post_ids(request.args.getlist('ids'), MAX_STATS_BATCH)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return json_response({'stats': get_posts_stats(post_ids)})
 
 @app.route('/stats/post/<post_id>/views', methods=['GET'])
+@admit('stats')
 def get_post_views_dynamics(post_id):
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
         return make_response(current_user_or_error, code)
 
     dynamics = get_view_dynamics(post_id)
-    return jsonify({'post_id': post_id, 'dynamics': dynamics})
+    return json_response({'post_id': post_id, 'dynamics': dynamics})
 
 @app.route('/stats/post/<post_id>/likes', methods=['GET'])
+@admit('stats')
 def get_post_likes_dynamics(post_id):
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
         return make_response(current_user_or_error, code)
 
     dynamics = get_like_dynamics(post_id)
-    return jsonify({'post_id': post_id, 'dynamics': dynamics})
+    return json_response({'post_id': post_id, 'dynamics': dynamics})
 
 @app.route('/stats/post/<post_id>/comments', methods=['GET'])
+@admit('stats')
 def get_post_comments_dynamics(post_id):
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
         return make_response(current_user_or_error, code)
 
     dynamics = get_comment_dynamics(post_id)
-    return jsonify({'post_id': post_id, 'dynamics': dynamics})
+    return json_response({'post_id': post_id, 'dynamics': dynamics})
+
+@app.route('/stats/post/<post_id>/dashboard', methods=['GET'])
+@admit('stats')
+def get_post_dashboard_stats(post_id):
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return make_response(current_user_or_error, code)
+
+    dashboard = get_post_dashboard(post_id)
+    return json_response(dashboard)
 
 @app.route('/stats/top/posts', methods=['GET'])
+@admit('stats')
 def get_top_posts_stats():
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
@@ -231,9 +328,19 @@ def get_top_posts_stats():
         return jsonify({'error': 'Invalid metric. Use "view", "like" or "comment"'}), 400
 
     top_posts = get_top_posts(metric)
-    return jsonify({'metric': metric, 'top_posts': top_posts})
+    if not parse_flag(request.args.get('with_posts')):
+        return json_response({'metric': metric, 'top_posts': top_posts})
+
+    # Тела постов одним BatchGetPosts; приватные чужие посты и удалённые приходят как post: null
+    try:
+        posts = batch_get_posts(current_user_or_error, [entry['post_id'] for entry in top_posts])
+    except grpc.RpcError as e:
+        print(f"Error getting top posts bodies: {e}")
+        posts = None
+    return json_response({'metric': metric, **top_posts_with_bodies(top_posts, posts)})
 
 @app.route('/stats/top/users', methods=['GET'])
+@admit('stats')
 def get_top_users_stats():
     current_user_or_error, code = get_user_from_token(request)
     if code != 200:
@@ -244,14 +351,52 @@ def get_top_users_stats():
         return jsonify({'error': 'Invalid metric. Use "view", "like" or "comment"'}), 400
 
     top_users = get_top_users(metric)
-    return jsonify({'metric': metric, 'top_users': top_users})
+    return json_response({'metric': metric, 'top_users': top_users})
+
+
+########################## Feed routes ##########################
+@app.route('/feed', methods=['GET'])
+@admit('posts')
+def get_feed():
+    current_user_or_error, code = get_user_from_token(request)
+    if code != 200:
+        return make_response(current_user_or_error, code)
+    username = current_user_or_error
+
+    try:
+        result = list_posts_from_args(username, request.args)
+    except grpc.RpcError:
+        return jsonify({"message": "Error in rpc"}), 400
+
+    post_ids = [post.id for post in result['posts']]
+    send_impression_event(username, post_ids)
+    return json_response(feed_to_dict(result, get_feed_stats(post_ids)))
+
+
+@app.route('/internal/post_list_cache', methods=['GET'])
+def get_post_list_cache_statistics():
+    return jsonify(get_post_list_cache_stats())
+
+@app.route('/internal/admission', methods=['GET'])
+def get_admission_statistics():
+    return jsonify(limiters_stats(limiters))
+
+@app.route('/internal/circuit_breakers', methods=['GET'])
+def get_circuit_breaker_statistics():
+    return jsonify({'stats': get_breaker_stats()})
+
+@app.route('/internal/top_cache', methods=['GET'])
+def get_top_cache_statistics():
+    return jsonify(get_top_cache_stats())
 
+@app.route('/internal/kafka_producer', methods=['GET'])
+def get_kafka_producer_statistics():
+    return jsonify(get_producer_metrics())
 
 
 if __name__ == '__main__':
     try:
-        with open("signature.pub", "r") as public_file:
-            public_key = public_file.read()
+        auth.init_public_key("signature.pub")
     except FileNotFoundError as e:
         print(f"Ошибка: {e}")
         exit(0)
@@ -0,0 +1,148 @@
+import atexit
+import itertools
+import os
+import threading
+import time
+import grpc
+import grpc.aio
+from metrics import GrpcMetricsInterceptor, AioGrpcMetricsInterceptor
+
+RECONNECT_INTERVAL = float(os.getenv("GRPC_RECONNECT_INTERVAL", "5"))
+# Сколько старый канал живёт после пересоздания: на его стабах ещё могут идти вызовы, должно быть не меньше самого долгого дедлайна
+CLOSE_GRACE = float(os.getenv("GRPC_CLOSE_GRACE", "30"))
+
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.initial_reconnect_backoff_ms', 200),
+    ('grpc.max_reconnect_backoff_ms', 5000),
+    # без этого grpc склеивает все каналы пула в одно соединение
+    ('grpc.use_local_subchannel_pool', 1),
+]
+
+BROKEN_STATES = (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+class ChannelPool:
+    """Fixed set of long-lived channels, handed out round-robin."""
+
+    def __init__(self, target, size, stub_class, options=None, reconnect_interval=RECONNECT_INTERVAL,
+                 interceptors=None, close_grace=CLOSE_GRACE):
+        self.target = target
+        self.size = max(1, size)
+        self.stub_class = stub_class
+        self.options = options or []
+        self.interceptors = interceptors or []
+        self.reconnect_interval = reconnect_interval
+        self.close_grace = close_grace
+        self._lock = threading.Lock()
+        self._channels = [None] * self.size
+        self._stubs = [None] * self.size
+        self._states = [None] * self.size
+        self._connected_at = [0.0] * self.size
+        self._counter = itertools.count()
+        self._retired = {}
+        self._closed = False
+
+    def _connect(self, index):
+        channel = grpc.insecure_channel(self.target, options=self.options)
+        self._channels[index] = channel
+        self._stubs[index] = self.stub_class(grpc.intercept_channel(channel, *self.interceptors))
+        self._states[index] = None
+        self._connected_at[index] = time.monotonic()
+        channel.subscribe(lambda state: self._on_state_change(index, channel, state), try_to_connect=True)
+
+    def _on_state_change(self, index, channel, state):
+        if self._channels[index] is channel:
+            self._states[index] = state
+
+    def _reconnect(self, index):
+        old = self._channels[index]
+        self._connect(index)
+        if old is not None:
+            # close() отменил бы вызовы, которые другие потоки уже ведут через старый стаб
+            timer = threading.Timer(self.close_grace, self._close_retired, args=(old,))
+            timer.daemon = True
+            self._retired[old] = timer
+            timer.start()
+
+    def _close_retired(self, channel):
+        with self._lock:
+            if self._retired.pop(channel, None) is None:
+                return
+        channel.close()
+
+    def _is_broken(self, index):
+        # grpc сам переподключается с backoff, канал пересоздаём не чаще reconnect_interval
+        return (self._states[index] in BROKEN_STATES
+                and time.monotonic() - self._connected_at[index] >= self.reconnect_interval)
+
+    def stub(self):
+        index = next(self._counter) % self.size
+        stub = self._stubs[index]
+        if stub is None or self._is_broken(index):
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Channel pool is closed")
+                if self._stubs[index] is None:
+                    self._connect(index)
+                elif self._is_broken(index):
+                    self._reconnect(index)
+                stub = self._stubs[index]
+        return stub
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for index, channel in enumerate(self._channels):
+                if channel is not None:
+                    channel.close()
+                self._channels[index] = None
+                self._stubs[index] = None
+            for channel, timer in self._retired.items():
+                timer.cancel()
+                channel.close()
+            self._retired.clear()
+
+
+def create_pool(target, size, stub_class, close_grace=CLOSE_GRACE):
+    pool = ChannelPool(target, size, stub_class, options=CHANNEL_OPTIONS, interceptors=[GrpcMetricsInterceptor()],
+                       close_grace=close_grace)
+    atexit.register(pool.close)
+    return pool
+
+
+class AioChannelPool:
+    """grpc.aio counterpart of ChannelPool; channels are created lazily inside the running event loop."""
+
+    def __init__(self, target, size, stub_class, options=None, interceptors=None):
+        self.target = target
+        self.size = max(1, size)
+        self.stub_class = stub_class
+        self.options = options or []
+        self.interceptors = interceptors or []
+        self._channels = [None] * self.size
+        self._stubs = [None] * self.size
+        self._counter = itertools.count()
+
+    def stub(self):
+        index = next(self._counter) % self.size
+        if self._stubs[index] is None:
+            # aio-каналы сами переподключаются, пересоздавать их не нужно
+            channel = grpc.aio.insecure_channel(self.target, options=self.options, interceptors=self.interceptors)
+            self._channels[index] = channel
+            self._stubs[index] = self.stub_class(channel)
+        return self._stubs[index]
+
+    async def close(self):
+        for index, channel in enumerate(self._channels):
+            if channel is not None:
+                await channel.close()
+            self._channels[index] = None
+            self._stubs[index] = None
+
+
+def create_aio_pool(target, size, stub_class):
+    return AioChannelPool(target, size, stub_class, options=CHANNEL_OPTIONS, interceptors=[AioGrpcMetricsInterceptor()])
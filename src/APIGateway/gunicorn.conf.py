@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# В gthread-воркере одновременно обрабатывается не больше threads запросов, ожидающие в очереди
+# admission control тоже занимают поток. Лимиты выше threads никогда не заполняются и не срезают
+# нагрузку, поэтому по умолчанию выводим их из threads: один медленный backend занимает
+# не больше 3/4 потоков. Явно заданные переменные окружения не трогаем.
+for backend, share in (('POSTS', 2), ('STATS', 4), ('USER', 4)):
+    os.environ.setdefault(f"{backend}_MAX_CONCURRENCY", str(max(1, threads // share)))
+    os.environ.setdefault(f"{backend}_MAX_QUEUE", str(max(1, threads // (share * 2))))
+
+# Версии кэша списков постов общие для всех воркеров (см. post_client.py)
+os.environ.setdefault("POST_LIST_VERSIONS_FILE", "/tmp/gateway_post_list_versions")
+
+# Метрики каждый воркер пишет в свой файл, /metrics суммирует файлы всех воркеров (см. metrics.py)
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/gateway_metrics")
+
+# Публичный ключ читается в мастере до fork, см. wsgi.py
+preload_app = True
+
+# Воркер перезапускается после max_requests (+ случайный сдвиг, чтобы не все сразу)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# На SIGTERM/SIGHUP воркеры дорабатывают текущие запросы не дольше graceful_timeout,
+# затем atexit закрывает каналы gRPC и дожидается отправки событий в Kafka
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+def on_starting(server):
+    # Файлы прошлого запуска сложились бы с новыми счётчиками
+    shutil.rmtree(os.environ["METRICS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_MULTIPROC_DIR"])
+
+def post_fork(server, worker):
+    import metrics
+    metrics.start_snapshots()
+
+def worker_exit(server, worker):
+    import metrics
+    from kafka_producer import producer
+    # снимок завершившегося воркера остаётся в сумме навсегда: сначала дожидаемся отправки событий,
+    # чтобы в нём не осталось событий в очереди
+    producer.close()
+    metrics.write_snapshot()
+
+def child_exit(server, worker):
+    # В мастере, в том числе после SIGKILL по таймауту: файл воркера переезжает в общий итог
+    import metrics
+    metrics.fold_snapshot(worker.pid)
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,63 @@
+import os
+import http.cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_POOL_MAXSIZE = int(os.getenv("USER_POOL_MAXSIZE", "32"))
+USER_CONNECT_TIMEOUT = float(os.getenv("USER_CONNECT_TIMEOUT", "2"))
+USER_READ_TIMEOUT = float(os.getenv("USER_READ_TIMEOUT", "10"))
+USER_RETRIES = int(os.getenv("USER_RETRIES", "2"))
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+HOP_BY_HOP_HEADERS = {
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'trailers',
+    'transfer-encoding',
+    'upgrade',
+}
+
+def create_session():
+    # Ретраим только идемпотентные методы, POST (signup/login) не повторяем
+    retries = Retry(
+        total=USER_RETRIES,
+        backoff_factor=0.05,
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=USER_POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=retries
+    )
+    session = requests.Session()
+    # Сессия общая для всех клиентов: Set-Cookie из /user/login не должен попадать в чужие запросы.
+    # Куки пользователя уходят только в его собственном заголовке Cookie
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+http_session = create_session()
+
+def strip_hop_by_hop(headers):
+    headers = list(headers)
+    excluded = set(HOP_BY_HOP_HEADERS)
+    for name, value in headers:
+        if name.lower() == 'connection':
+            excluded.update(token.strip().lower() for token in value.split(','))
+    return [(name, value) for name, value in headers if name.lower() not in excluded]
+
+def stream_body(res):
+    try:
+        for chunk in res.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+            yield chunk
+    finally:
+        res.close()
@@ -0,0 +1,396 @@
+import bisect
+import fcntl
+import functools
+import glob
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import grpc
+import grpc.aio
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Доля запросов, для которых пишется latency; ошибки считаются всегда
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1"))
+
+# Под gunicorn: каталог, куда каждый воркер раз в METRICS_FLUSH_INTERVAL секунд пишет свои значения.
+# /metrics суммирует файлы живых воркеров и exited.json, куда мастер складывает итоги завершившихся
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(values, other):
+        for labels, value in other.items():
+            values[labels] = values.get(labels, 0) + value
+
+    @staticmethod
+    def load(items):
+        return {tuple(labels): value for labels, value in items}
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        values = sorted((self.values() if values is None else values).items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus three additions under a lock."""
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # последний элемент — бакет +Inf
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def values(self):
+        with self._lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(values, other):
+        for labels, (counts, total, count) in other.items():
+            if labels not in values:
+                values[labels] = (list(counts), total, count)
+                continue
+            own_counts, own_total, own_count = values[labels]
+            values[labels] = ([a + b for a, b in zip(own_counts, counts)], own_total + total, own_count + count)
+
+    @staticmethod
+    def load(items):
+        return {tuple(labels): (counts, total, count) for labels, (counts, total, count) in items}
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        values = sorted((self.values() if values is None else values).items())
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class CallbackMetric:
+    """Unlabelled value read from func() at scrape time; across gunicorn workers it is summed like a counter."""
+
+    def __init__(self, name, documentation, kind, func):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.func = func
+
+    def values(self):
+        return {(): self.func()}
+
+    merge = staticmethod(Counter.merge)
+    load = staticmethod(Counter.load)
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in sorted((self.values() if values is None else values).items()):
+            lines.append(f'{self.name} {value}')
+        return lines
+
+
+request_latency = Histogram(
+    'gateway_request_duration_seconds', 'Gateway request latency by route (sampled).', ('method', 'route', 'status')
+)
+request_errors = Counter(
+    'gateway_request_errors_total', 'Gateway responses with status >= 500 by route.', ('method', 'route', 'status')
+)
+downstream_latency = Histogram(
+    'gateway_downstream_duration_seconds', 'Latency of calls made by the gateway (sampled).', ('backend', 'call')
+)
+downstream_errors = Counter(
+    'gateway_downstream_errors_total', 'Failed calls made by the gateway.', ('backend', 'call')
+)
+
+REGISTRY = [request_latency, request_errors, downstream_latency, downstream_errors]
+
+
+def register_producer(producer):
+    """Publishes the Kafka producer's own counters (EventProducer.metrics()) on /metrics."""
+    # gateway и async_gateway могут быть импортированы в одном процессе
+    if any(metric.name == 'gateway_kafka_events_queued' for metric in REGISTRY):
+        return
+    REGISTRY.extend([
+        CallbackMetric('gateway_kafka_events_queued', 'Events handed to the Kafka producer and not yet acknowledged.',
+                       'gauge', lambda: producer.metrics()['queued']),
+        CallbackMetric('gateway_kafka_events_sent_total', 'Events acknowledged by Kafka.',
+                       'counter', lambda: producer.metrics()['sent']),
+        CallbackMetric('gateway_kafka_events_failed_total', 'Events that could not be delivered to Kafka.',
+                       'counter', lambda: producer.metrics()['failed']),
+    ])
+
+def sampled():
+    return METRICS_ENABLED and (METRICS_SAMPLE_RATE >= 1 or random.random() < METRICS_SAMPLE_RATE)
+
+def render():
+    lines = [
+        '# HELP gateway_metrics_sample_rate Fraction of requests whose latency is recorded.',
+        '# TYPE gateway_metrics_sample_rate gauge',
+        f'gateway_metrics_sample_rate {METRICS_SAMPLE_RATE if METRICS_ENABLED else 0}',
+    ]
+    merged = _merged_values() if METRICS_MULTIPROC_DIR else {}
+    for metric in REGISTRY:
+        lines.extend(metric.render(merged.get(metric.name)))
+    return '\n'.join(lines) + '\n'
+
+########################## Multiprocess #########################
+def _snapshot_path(pid):
+    return os.path.join(METRICS_MULTIPROC_DIR, f'{pid}.json')
+
+EXITED_SNAPSHOT = 'exited.json'
+
+@contextmanager
+def _dir_lock(operation):
+    # Чтение снимков (LOCK_SH) не должно застать exited.json уже с итогами воркера, а его файл — ещё не удалённым
+    fd = os.open(os.path.join(METRICS_MULTIPROC_DIR, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+def _write(values, path):
+    snapshot = {name: [[list(labels), value] for labels, value in series.items()] for name, series in values.items()}
+    # запись через rename: читатель не увидит наполовину записанный файл
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+def _read_into(merged, path):
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    for metric in REGISTRY:
+        metric.merge(merged[metric.name], metric.load(snapshot.get(metric.name, [])))
+
+def write_snapshot():
+    if not METRICS_MULTIPROC_DIR:
+        return
+    _write({metric.name: metric.values() for metric in REGISTRY}, _snapshot_path(os.getpid()))
+
+def fold_snapshot(pid):
+    """Called in the gunicorn master when a worker exits: moves its last snapshot into exited.json."""
+    if not METRICS_MULTIPROC_DIR:
+        return
+    path = _snapshot_path(pid)
+    exited = os.path.join(METRICS_MULTIPROC_DIR, EXITED_SNAPSHOT)
+    with _dir_lock(fcntl.LOCK_EX):
+        if not os.path.exists(path):
+            return
+        merged = {metric.name: {} for metric in REGISTRY}
+        _read_into(merged, exited)
+        _read_into(merged, path)
+        _write(merged, exited)
+        # новый воркер с тем же pid начнёт свой файл с нуля, не затирая итоги прежнего
+        os.remove(path)
+
+def _merged_values():
+    # свои значения берём живыми, чужие — из последних снимков
+    merged = {metric.name: metric.values() for metric in REGISTRY}
+    own = _snapshot_path(os.getpid())
+    with _dir_lock(fcntl.LOCK_SH):
+        for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, '*.json')):
+            if path != own:
+                _read_into(merged, path)
+    return merged
+
+def start_snapshots():
+    """Called in each gunicorn worker after fork: periodically publishes this worker's values for /metrics."""
+    if not METRICS_MULTIPROC_DIR:
+        return
+
+    def loop():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                write_snapshot()
+            except OSError as e:
+                print(f"Error writing metrics snapshot: {e}")
+
+    threading.Thread(target=loop, name='metrics-snapshot', daemon=True).start()
+
+def observe_request(method, route, status, duration):
+    if status >= 500:
+        request_errors.inc((method, route, str(status)))
+    if duration is not None:
+        request_latency.observe((method, route, str(status)), duration)
+
+def observe_call(backend, call, failed, duration):
+    if failed:
+        downstream_errors.inc((backend, call))
+    if duration is not None:
+        downstream_latency.observe((backend, call), duration)
+
+@contextmanager
+def timed(backend, call):
+    started = time.perf_counter() if sampled() else None
+    try:
+        yield
+    except Exception:
+        observe_call(backend, call, True, None if started is None else time.perf_counter() - started)
+        raise
+    observe_call(backend, call, False, None if started is None else time.perf_counter() - started)
+
+def instrument(backend, call):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(backend, call):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+########################## gRPC #########################
+def _grpc_labels(method):
+    # '/post.PostService/ListPosts' -> ('PostService', 'ListPosts'); в grpc.aio имя метода приходит в bytes
+    if isinstance(method, bytes):
+        method = method.decode()
+    service, _, call = method.rpartition('/')
+    return service.rpartition('.')[2], call
+
+
+class GrpcMetricsInterceptor(grpc.UnaryUnaryClientInterceptor):
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        backend, call = _grpc_labels(client_call_details.method)
+        started = time.perf_counter() if sampled() else None
+        outcome = continuation(client_call_details, request)
+        # для блокирующих вызовов callback срабатывает сразу, для .future() — по завершении
+        outcome.add_done_callback(lambda f: observe_call(
+            backend, call, f.exception() is not None,
+            None if started is None else time.perf_counter() - started
+        ))
+        return outcome
+
+
+class AioGrpcMetricsInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        backend, call = _grpc_labels(client_call_details.method)
+        started = time.perf_counter() if sampled() else None
+        rpc = await continuation(client_call_details, request)
+        failed = False
+        try:
+            await rpc
+        except grpc.RpcError:
+            failed = True
+        observe_call(backend, call, failed, None if started is None else time.perf_counter() - started)
+        # повторный await завершённого вызова вернёт тот же ответ или ту же ошибку
+        return rpc
+
+
+########################## HTTP #########################
+def init_flask(app):
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter() if sampled() else None
+
+    @app.after_request
+    def record_request(response):
+        if not METRICS_ENABLED:
+            return response
+        started = g.get('metrics_started')
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe_request(
+            request.method, route, response.status_code,
+            None if started is None else time.perf_counter() - started
+        )
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+
+class AsgiMetricsMiddleware:
+    """Records per-route latency for a Starlette app; the route label is the path template, not the raw path."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _route(self, scope):
+        from starlette.routing import Match
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter() if sampled() else None
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe_request(
+                scope['method'], self._route(scope), status[0],
+                None if started is None else time.perf_counter() - started
+            )
@@ -0,0 +1,170 @@
+import os
+from proto import post_pb2, post_pb2_grpc
+from grpc_pool import create_pool
+from cache import VersionedCache, LocalVersions, SharedVersions
+
+POST_SERVICE_ADDR = os.getenv("POST_SERVICE_ADDR", "post_service:50051")
+POST_CHANNEL_POOL_SIZE = int(os.getenv("POST_CHANNEL_POOL_SIZE", "4"))
+
+post_channel_pool = create_pool(POST_SERVICE_ADDR, POST_CHANNEL_POOL_SIZE, post_pb2_grpc.PostServiceStub)
+
+
+def get_post_client():
+    return post_channel_pool.stub()
+
+
+########################## Post list cache ##########################
+# Публичные страницы ленты одинаковы для всех, кэшируем их по (tag, page, page_size).
+# Приватные посты пользователя кэшируются отдельно и вмешиваются в страницу при выдаче.
+POST_LIST_CACHE_TTL = float(os.getenv("POST_LIST_CACHE_TTL", "10"))
+POST_LIST_CACHE_SIZE = int(os.getenv("POST_LIST_CACHE_SIZE", "2000"))
+# Под gunicorn версии namespace'ов лежат в общем файле (см. gunicorn.conf.py): запись, сделавшая пост
+# приватным или удалившая его, сбрасывает кэш во всех воркерах, а не только в обработавшем её
+POST_LIST_VERSIONS_FILE = os.getenv("POST_LIST_VERSIONS_FILE", "")
+MAX_PRIVATE_POSTS = int(os.getenv("MAX_PRIVATE_POSTS", "1000"))
+MAX_PAGE_SIZE = 100
+
+post_list_cache = VersionedCache(
+    ttl=POST_LIST_CACHE_TTL, maxsize=POST_LIST_CACHE_SIZE,
+    versions=SharedVersions(POST_LIST_VERSIONS_FILE) if POST_LIST_VERSIONS_FILE else LocalVersions()
+)
+
+def _sort_key(post):
+    return (post.created_at, post.id)
+
+def _public_page(tag, page, page_size):
+    return post_list_cache.get(('tag', tag), (page, page_size), lambda: get_post_client().ListPosts(
+        post_pb2.ListPostsRequest(page=page, page_size=page_size, username='', tag=tag)
+    ))
+
+def _load_private_posts(username, tag):
+    """All private posts of username, or None when there are more than MAX_PRIVATE_POSTS of them."""
+    posts = []
+    page = 1
+    while True:
+        response = get_post_client().ListPosts(post_pb2.ListPostsRequest(
+            page=page, page_size=MAX_PAGE_SIZE, username=username, tag=tag, private_only=True
+        ))
+        if response.total > MAX_PRIVATE_POSTS:
+            return None
+        posts.extend(response.posts)
+        if page >= response.pages:
+            return posts
+        page += 1
+
+def _direct_page(username, tag, page, page_size):
+    # Слишком много приватных постов, чтобы вклеивать их в кэшированные страницы:
+    # страницу и total собирает сам PostService
+    response = get_post_client().ListPosts(post_pb2.ListPostsRequest(
+        page=page, page_size=page_size, username=username, tag=tag
+    ))
+    return list(response.posts), response.total
+
+def _private_posts(username, tag):
+    return post_list_cache.get(('user', username), tag, lambda: _load_private_posts(username, tag))
+
+def first_public_page(start, privates_count, page_size):
+    # Перед началом страницы могут стоять не больше privates_count приватных постов,
+    # поэтому публичные нужны начиная со смещения start - privates_count
+    return max(0, start - privates_count) // page_size + 1
+
+def merge_window(window, offset, public_total, privates, start, end):
+    merged = sorted(window + privates, key=_sort_key, reverse=True)
+    position = 0
+    if window and offset > 0:
+        # Позиция первого публичного поста окна в общей ленте известна точно
+        anchor = _sort_key(window[0])
+        position = offset + sum(1 for post in privates if _sort_key(post) > anchor)
+        merged = [post for post in merged if _sort_key(post) <= anchor]
+    if window and offset + len(window) < public_total:
+        # Дальше окна лежат непрочитанные публичные посты, приватные за ними не упорядочить
+        last = _sort_key(window[-1])
+        merged = [post for post in merged if _sort_key(post) >= last]
+
+    return merged[start - position:end - position], public_total + len(privates)
+
+def list_result(posts, total, page, page_size):
+    return {
+        'posts': posts,
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'pages': (total + page_size - 1) // page_size
+    }
+
+def _merge_private_posts(privates, tag, page, page_size):
+    start = (page - 1) * page_size
+    end = start + page_size
+
+    public_page = first_public_page(start, len(privates), page_size)
+    response = _public_page(tag, public_page, page_size)
+    public_total = response.total
+    if not response.posts and public_total:
+        public_page = (public_total - 1) // page_size + 1
+        response = _public_page(tag, public_page, page_size)
+
+    offset = (public_page - 1) * page_size
+    window = list(response.posts)
+    while offset + len(window) < min(end, public_total):
+        public_page += 1
+        response = _public_page(tag, public_page, page_size)
+        if not response.posts:
+            break
+        window.extend(response.posts)
+
+    return merge_window(window, offset, public_total, privates, start, end)
+
+def list_posts(username, tag, page, page_size):
+    page = max(1, page)
+    page_size = min(MAX_PAGE_SIZE, max(1, page_size))
+
+    privates = _private_posts(username, tag) if username else []
+    if privates is None:
+        posts, total = _direct_page(username, tag, page, page_size)
+    elif privates:
+        posts, total = _merge_private_posts(privates, tag, page, page_size)
+    else:
+        response = _public_page(tag, page, page_size)
+        posts, total = list(response.posts), response.total
+
+    return list_result(posts, total, page, page_size)
+
+def cursor_request(username, tag, cursor, page_size):
+    return post_pb2.ListPostsRequest(
+        page=1, page_size=min(MAX_PAGE_SIZE, max(1, page_size)), username=username, tag=tag,
+        cursor=cursor, skip_total=True
+    )
+
+def cursor_result(response):
+    return {'posts': list(response.posts), 'next_cursor': response.next_cursor}
+
+def list_posts_after(username, tag, cursor, page_size):
+    # Keyset-страницы идут мимо кэша: приватные посты фильтрует сам PostService, total не считается
+    return cursor_result(get_post_client().ListPosts(cursor_request(username, tag, cursor, page_size)))
+
+def search_request(username, query, cursor, page_size):
+    return post_pb2.SearchPostsRequest(
+        query=query, username=username, cursor=cursor, page_size=min(MAX_PAGE_SIZE, max(1, page_size))
+    )
+
+def search_posts(username, query, cursor, page_size):
+    # Результаты зависят от запроса и видимости для username, в кэш списков не кладём
+    return cursor_result(get_post_client().SearchPosts(search_request(username, query, cursor, page_size)))
+
+def batch_get_posts(username, post_ids):
+    if not post_ids:
+        return post_pb2.BatchGetPostsResponse()
+    return get_post_client().BatchGetPosts(post_pb2.BatchGetPostsRequest(post_ids=post_ids, username=username))
+
+def invalidate_created_post(post):
+    if post.is_private:
+        post_list_cache.bump(('user', post.username))
+    else:
+        post_list_cache.bump(('tag', ''), *[('tag', tag) for tag in post.tags])
+
+def invalidate_post_lists():
+    # Старые теги и видимость изменённого/удалённого поста шлюзу неизвестны, сбрасываем всё
+    post_list_cache.bump_all()
+
+def get_post_list_cache_stats():
+    return post_list_cache.stats()
@@ -1,77 +1,209 @@
+import os
+import time
 import grpc
 from proto import statistics_pb2 as pb2
 from proto import statistics_pb2_grpc as pb2_grpc
+from grpc_pool import create_pool, CLOSE_GRACE
+from cache import TTLCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError, LastKnownGood
+from encoder import post_stats_to_dict, posts_stats_to_list, posts_stats_by_id, dynamics_to_list, top_posts_to_list, top_users_to_list
+
+STATS_SERVICE_ADDR = os.getenv("STATS_SERVICE_ADDR", "statistics_service:50052")
+STATS_CHANNEL_POOL_SIZE = int(os.getenv("STATS_CHANNEL_POOL_SIZE", "1"))
+
+# Дедлайны в секундах, топы считаются по всей таблице и получают больше времени
+STATS_TIMEOUT = float(os.getenv("STATS_TIMEOUT", "2"))
+STATS_TOP_TIMEOUT = float(os.getenv("STATS_TOP_TIMEOUT", "5"))
+# Счётчики в /feed необязательны, ждём их недолго
+FEED_STATS_TIMEOUT = float(os.getenv("FEED_STATS_TIMEOUT", "0.3"))
+
+# Кэш топов: свежие TOP_CACHE_TTL секунд, ещё TOP_CACHE_STALE_TTL отдаём устаревшие и обновляем в фоне
+TOP_CACHE_TTL = float(os.getenv("TOP_CACHE_TTL", "30"))
+TOP_CACHE_STALE_TTL = float(os.getenv("TOP_CACHE_STALE_TTL", "300"))
+
+# Circuit breaker: открывается по доле ошибок или медленных вызовов за окно STATS_BREAKER_WINDOW секунд
+STATS_BREAKER_WINDOW = float(os.getenv("STATS_BREAKER_WINDOW", "30"))
+STATS_BREAKER_MIN_CALLS = int(os.getenv("STATS_BREAKER_MIN_CALLS", "10"))
+STATS_BREAKER_FAILURE_RATE = float(os.getenv("STATS_BREAKER_FAILURE_RATE", "0.5"))
+STATS_BREAKER_SLOW_CALL = float(os.getenv("STATS_BREAKER_SLOW_CALL", "1"))
+STATS_BREAKER_SLOW_RATE = float(os.getenv("STATS_BREAKER_SLOW_RATE", "0.8"))
+STATS_BREAKER_OPEN_TIMEOUT = float(os.getenv("STATS_BREAKER_OPEN_TIMEOUT", "10"))
+STATS_BREAKER_PROBES = int(os.getenv("STATS_BREAKER_PROBES", "3"))
+
+EMPTY_POST_STATS = {'views': 0, 'likes': 0, 'comments': 0}
+MAX_STATS_BATCH = int(os.getenv("MAX_STATS_BATCH", "100"))
+STATS_ERRORS = (grpc.RpcError, CircuitOpenError)
+
+RPC_TIMEOUTS = {
+    'GetPostStats': STATS_TIMEOUT,
+    'GetPostsStatsBatch': STATS_TIMEOUT,
+    'GetViewDynamics': STATS_TIMEOUT,
+    'GetLikeDynamics': STATS_TIMEOUT,
+    'GetCommentDynamics': STATS_TIMEOUT,
+    'GetTopPosts': STATS_TOP_TIMEOUT,
+    'GetTopUsers': STATS_TOP_TIMEOUT,
+}
+
+METRIC_MAP = {
+    'view': pb2.TopRequest.MetricType.VIEW,
+    'like': pb2.TopRequest.MetricType.LIKE,
+    'comment': pb2.TopRequest.MetricType.COMMENT
+}
+
+stats_channel_pool = create_pool(STATS_SERVICE_ADDR, STATS_CHANNEL_POOL_SIZE, pb2_grpc.StatisticsServiceStub,
+                                 close_grace=max(CLOSE_GRACE, *RPC_TIMEOUTS.values()))
+top_cache = TTLCache(ttl=TOP_CACHE_TTL, stale_ttl=TOP_CACHE_STALE_TTL)
+stats_breaker = CircuitBreaker(
+    'statistics_service',
+    window=STATS_BREAKER_WINDOW,
+    min_calls=STATS_BREAKER_MIN_CALLS,
+    failure_rate=STATS_BREAKER_FAILURE_RATE,
+    slow_call_duration=STATS_BREAKER_SLOW_CALL,
+    slow_call_rate=STATS_BREAKER_SLOW_RATE,
+    open_timeout=STATS_BREAKER_OPEN_TIMEOUT,
+    half_open_calls=STATS_BREAKER_PROBES
+)
+last_known_good = LastKnownGood()
 
 def get_statistics_client():
-    channel = grpc.insecure_channel('statistics_service:50052')
-    return pb2_grpc.StatisticsServiceStub(channel)
+    return stats_channel_pool.stub()
+
+def _call(method, request, timeout=None):
+    if not stats_breaker.allow():
+        raise CircuitOpenError("Statistics service circuit is open")
+    # Исход записываем при любом исключении, иначе слот пробного вызова в half-open не освободится
+    started = time.monotonic()
+    success = False
+    try:
+        response = getattr(get_statistics_client(), method)(request, timeout=timeout or RPC_TIMEOUTS[method])
+        success = True
+    finally:
+        stats_breaker.record(success, time.monotonic() - started)
+    return response
+
+def _call_future(method, request):
+    if not stats_breaker.allow():
+        raise CircuitOpenError("Statistics service circuit is open")
+    started = time.monotonic()
+    try:
+        future = getattr(get_statistics_client(), method).future(request, timeout=RPC_TIMEOUTS[method])
+    except Exception:
+        stats_breaker.record(False, time.monotonic() - started)
+        raise
+    # exception() у отменённого future бросает CancelledError, отмену считаем неудачей
+    future.add_done_callback(
+        lambda f: stats_breaker.record(not f.cancelled() and f.exception() is None, time.monotonic() - started)
+    )
+    return future
+
+def metric_enum(metric_type):
+    return METRIC_MAP.get(metric_type.lower(), pb2.TopRequest.MetricType.VIEW)
+
+def result_key(method, request):
+    return (method, request.SerializeToString())
+
+def _fetch(method, request, convert, default):
+    key = result_key(method, request)
+    try:
+        result = convert(_call(method, request))
+    except STATS_ERRORS as e:
+        print(f"Error calling {method}: {e}")
+        return last_known_good.get(key, default)
+    last_known_good.put(key, result)
+    return result
 
 def get_post_stats(post_id):
-    client = get_statistics_client()
+    return _fetch('GetPostStats', pb2.PostIdRequest(post_id=int(post_id)), post_stats_to_dict, EMPTY_POST_STATS)
+
+def empty_posts_stats(post_ids):
+    return [{'post_id': post_id, **EMPTY_POST_STATS} for post_id in post_ids]
+
+def get_posts_stats(post_ids):
+    request = pb2.PostIdsRequest(post_ids=post_ids)
+    return _fetch('GetPostsStatsBatch', request, posts_stats_to_list, empty_posts_stats(request.post_ids))
+
+def get_feed_stats(post_ids):
+    """Counters keyed by post id, or None if StatisticsService did not answer within FEED_STATS_TIMEOUT."""
+    if not post_ids:
+        return {}
     try:
-        response = client.GetPostStats(pb2.PostIdRequest(post_id=int(post_id)))
-        return {
-            'views': response.views,
-            'likes': response.likes,
-            'comments': response.comments
-        }
-    except grpc.RpcError as e:
-        print(f"Error getting post stats: {e}")
-        return {'views': 0, 'likes': 0, 'comments': 0}
+        response = _call('GetPostsStatsBatch', pb2.PostIdsRequest(post_ids=post_ids), timeout=FEED_STATS_TIMEOUT)
+    except STATS_ERRORS as e:
+        print(f"Error getting feed stats: {e}")
+        return None
+    return posts_stats_by_id(response)
 
 def get_view_dynamics(post_id):
-    client = get_statistics_client()
-    try:
-        response = client.GetViewDynamics(pb2.PostIdRequest(post_id=int(post_id)))
-        return [{'date': day.date, 'count': day.count} for day in response.data]
-    except grpc.RpcError as e:
-        print(f"Error getting view dynamics: {e}")
-        return []
+    return _fetch('GetViewDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
 
 def get_like_dynamics(post_id):
-    client = get_statistics_client()
-    try:
-        response = client.GetLikeDynamics(pb2.PostIdRequest(post_id=int(post_id)))
-        return [{'date': day.date, 'count': day.count} for day in response.data]
-    except grpc.RpcError as e:
-        print(f"Error getting like dynamics: {e}")
-        return []
+    return _fetch('GetLikeDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
 
 def get_comment_dynamics(post_id):
-    client = get_statistics_client()
-    try:
-        response = client.GetCommentDynamics(pb2.PostIdRequest(post_id=int(post_id)))
-        return [{'date': day.date, 'count': day.count} for day in response.data]
-    except grpc.RpcError as e:
-        print(f"Error getting comment dynamics: {e}")
-        return []
+    return _fetch('GetCommentDynamics', pb2.PostIdRequest(post_id=int(post_id)), dynamics_to_list, [])
+
+def get_post_dashboard(post_id):
+    request = pb2.PostIdRequest(post_id=int(post_id))
+    parts = {
+        'stats': ('GetPostStats', post_stats_to_dict, EMPTY_POST_STATS),
+        'views': ('GetViewDynamics', dynamics_to_list, []),
+        'likes': ('GetLikeDynamics', dynamics_to_list, []),
+        'comments': ('GetCommentDynamics', dynamics_to_list, []),
+    }
+
+    # Все четыре запроса уходят сразу, ждём самый медленный, а не сумму
+    futures = {}
+    for key, (method, _, _) in parts.items():
+        try:
+            futures[key] = _call_future(method, request)
+        except CircuitOpenError:
+            futures[key] = None
+
+    dashboard = {'post_id': int(post_id)}
+    for key, (method, convert, default) in parts.items():
+        cache_key = result_key(method, request)
+        try:
+            if futures[key] is None:
+                raise CircuitOpenError("Statistics service circuit is open")
+            dashboard[key] = convert(futures[key].result())
+            last_known_good.put(cache_key, dashboard[key])
+        except STATS_ERRORS as e:
+            print(f"Error getting {key} for dashboard: {e}")
+            dashboard[key] = last_known_good.get(cache_key, default)
+    return dashboard
+
+def _fetch_top_posts(metric_type):
+    response = _call('GetTopPosts', pb2.TopRequest(metric=metric_enum(metric_type)))
+    return top_posts_to_list(response)
+
+def _fetch_top_users(metric_type):
+    response = _call('GetTopUsers', pb2.TopRequest(metric=metric_enum(metric_type)))
+    return top_users_to_list(response)
 
 def get_top_posts(metric_type):
-    client = get_statistics_client()
+    key = ('top_posts', metric_type)
     try:
-        metric_map = {
-            'view': pb2.TopRequest.MetricType.VIEW,
-            'like': pb2.TopRequest.MetricType.LIKE,
-            'comment': pb2.TopRequest.MetricType.COMMENT
-        }
-        metric = metric_map.get(metric_type.lower(), pb2.TopRequest.MetricType.VIEW)
-        response = client.GetTopPosts(pb2.TopRequest(metric=metric))
-        return [{'post_id': int(post.post_id), 'count': post.count} for post in response.top_posts]
-    except grpc.RpcError as e:
+        result = top_cache.get(('posts', metric_type), lambda: _fetch_top_posts(metric_type))
+    except STATS_ERRORS as e:
         print(f"Error getting top posts: {e}")
-        return []
+        return last_known_good.get(key, [])
+    last_known_good.put(key, result)
+    return result
 
 def get_top_users(metric_type):
-    client = get_statistics_client()
+    key = ('top_users', metric_type)
     try:
-        metric_map = {
-            'view': pb2.TopRequest.MetricType.VIEW,
-            'like': pb2.TopRequest.MetricType.LIKE,
-            'comment': pb2.TopRequest.MetricType.COMMENT
-        }
-        metric = metric_map.get(metric_type.lower(), pb2.TopRequest.MetricType.VIEW)
-        response = client.GetTopUsers(pb2.TopRequest(metric=metric))
-        return [{'user_id': user.user_id, 'count': user.count} for user in response.top_users]
-    except grpc.RpcError as e:
+        result = top_cache.get(('users', metric_type), lambda: _fetch_top_users(metric_type))
+    except STATS_ERRORS as e:
         print(f"Error getting top users: {e}")
-        return []
+        return last_known_good.get(key, [])
+    last_known_good.put(key, result)
+    return result
+
+def get_top_cache_stats():
+    return top_cache.stats()
+
+def get_breaker_stats():
+    stats = stats_breaker.stats()
+    stats['last_known_good_served'] = last_known_good.served
+    return stats
@@ -0,0 +1,46 @@
+"""Post-list cache invalidation shared between gunicorn workers.
+
+Run from the APIGateway directory: python -m pytest tests
+"""
+import pytest
+from cache import VersionedCache, SharedVersions
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # Два воркера — два независимых отображения одного файла, как после fork в gunicorn
+    path = str(tmp_path / "versions")
+    return [VersionedCache(ttl=60, maxsize=100, versions=SharedVersions(path)) for _ in range(2)]
+
+
+def load(cache, namespace, key, value):
+    return cache.get(namespace, key, lambda: value)
+
+
+def test_bump_invalidates_every_worker(workers):
+    first, second = workers
+    assert load(second, ('tag', ''), (1, 10), 'old page') == 'old page'
+
+    first.bump(('tag', ''))
+
+    assert load(second, ('tag', ''), (1, 10), 'new page') == 'new page'
+
+
+def test_bump_all_invalidates_every_worker(workers):
+    first, second = workers
+    load(second, ('user', 'alice'), '', 'old')
+    load(second, ('tag', 'go'), (1, 10), 'old')
+
+    first.bump_all()
+
+    assert load(second, ('user', 'alice'), '', 'new') == 'new'
+    assert load(second, ('tag', 'go'), (1, 10), 'new') == 'new'
+
+
+def test_other_namespaces_stay_cached(workers):
+    first, second = workers
+    load(second, ('tag', 'go'), (1, 10), 'cached')
+
+    first.bump(('tag', 'rust'))
+
+    assert load(second, ('tag', 'go'), (1, 10), 'reloaded') == 'cached'
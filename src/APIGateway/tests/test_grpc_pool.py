@@ -0,0 +1,66 @@
+"""Recreating a broken channel must not cancel calls already running on the old one."""
+from concurrent import futures
+import threading
+import time
+import grpc
+import pytest
+from grpc_pool import ChannelPool
+
+
+class SlowStub:
+    def __init__(self, channel):
+        self.Sleep = channel.unary_unary('/test.Slow/Sleep')
+
+
+@pytest.fixture
+def target():
+    def sleep(request, context):
+        time.sleep(float(request))
+        return request
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(
+        'test.Slow', {'Sleep': grpc.unary_unary_rpc_method_handler(sleep)}
+    )])
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    yield f'127.0.0.1:{port}'
+    server.stop(None)
+
+
+def force_reconnect(pool):
+    pool._states[0] = grpc.ChannelConnectivity.TRANSIENT_FAILURE
+    return pool.stub()
+
+
+def test_reconnect_keeps_in_flight_calls(target):
+    pool = ChannelPool(target, 1, SlowStub, reconnect_interval=0, close_grace=1)
+    old_stub = pool.stub()
+    old_channel = pool._channels[0]
+    call = old_stub.Sleep.future(b'0.3', timeout=5)
+    time.sleep(0.1)
+
+    new_stub = force_reconnect(pool)
+    assert new_stub is not old_stub
+    assert call.result() == b'0.3'
+    assert new_stub.Sleep(b'0', timeout=5) == b'0'
+
+    # после grace period старый канал закрыт
+    assert old_channel in pool._retired
+    time.sleep(1.2)
+    assert old_channel not in pool._retired
+    with pytest.raises(ValueError):
+        old_stub.Sleep(b'0', timeout=5)
+    pool.close()
+
+
+def test_close_drops_retired_channels(target):
+    pool = ChannelPool(target, 1, SlowStub, reconnect_interval=0, close_grace=60)
+    pool.stub()
+    force_reconnect(pool)
+    timers = list(pool._retired.values())
+    pool.close()
+    assert not pool._retired
+    for timer in timers:
+        timer.join(1)
+        assert not timer.is_alive()
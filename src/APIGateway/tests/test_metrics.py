@@ -0,0 +1,57 @@
+"""/metrics aggregation across gunicorn workers (METRICS_MULTIPROC_DIR)."""
+import json
+import os
+import pytest
+import metrics
+
+REQUESTS = 'gateway_request_errors_total'
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_MULTIPROC_DIR', str(tmp_path))
+    return tmp_path
+
+
+def worker_snapshot(metrics_dir, pid, errors):
+    # снимок другого воркера: errors ответов 500 на GET /posts
+    with open(metrics_dir / f'{pid}.json', 'w') as f:
+        json.dump({REQUESTS: [[['GET', '/posts', '500'], errors]]}, f)
+
+
+def scraped_errors():
+    values = metrics._merged_values()[REQUESTS]
+    own = metrics.request_errors.values()
+    return values.get(('GET', '/posts', '500'), 0) - own.get(('GET', '/posts', '500'), 0)
+
+
+def test_exited_workers_are_folded(metrics_dir):
+    worker_snapshot(metrics_dir, 101, 3)
+    worker_snapshot(metrics_dir, 102, 4)
+
+    metrics.fold_snapshot(101)
+
+    assert scraped_errors() == 7
+    assert sorted(os.listdir(metrics_dir)) == ['.lock', '102.json', 'exited.json']
+
+
+def test_reused_pid_does_not_overwrite_exited_totals(metrics_dir):
+    worker_snapshot(metrics_dir, 101, 5)
+    metrics.fold_snapshot(101)
+    # новый воркер получил тот же pid и начал счёт с нуля
+    worker_snapshot(metrics_dir, 101, 1)
+    assert scraped_errors() == 6
+
+    metrics.fold_snapshot(101)
+    worker_snapshot(metrics_dir, 101, 2)
+
+    assert scraped_errors() == 8
+
+
+def test_many_restarts_keep_one_file(metrics_dir):
+    for pid in range(1000, 1050):
+        worker_snapshot(metrics_dir, pid, 1)
+        metrics.fold_snapshot(pid)
+
+    assert scraped_errors() == 50
+    assert sorted(os.listdir(metrics_dir)) == ['.lock', 'exited.json']
@@ -0,0 +1,161 @@
+"""Splicing a user's private posts into cached public pages (list_posts in post_client and aio_clients).
+
+Every page is compared with the same page cut from one sorted list of all visible posts.
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+import aio_clients
+import post_client
+
+
+def make_posts(count, first_id, created_at=lambda i: f"2024-01-01T00:00:{i:02d}", is_private=False):
+    return [
+        SimpleNamespace(id=first_id + i, created_at=created_at(i), is_private=is_private)
+        for i in range(count)
+    ]
+
+
+def newest_first(posts):
+    return sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)
+
+
+@pytest.fixture(params=["sync", "async"])
+def list_posts(request):
+    if request.param == "sync":
+        return post_client.list_posts
+    return lambda *args: asyncio.run(aio_clients.list_posts(*args))
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Serves the given public and private posts the way PostService and the cache would."""
+    def setup(public, private):
+        public = newest_first(public)
+        private = newest_first(private)
+
+        def public_page(tag, page, page_size):
+            start = (page - 1) * page_size
+            return SimpleNamespace(posts=public[start:start + page_size], total=len(public))
+
+        async def public_page_async(tag, page, page_size):
+            return public_page(tag, page, page_size)
+
+        async def private_posts_async(username, tag):
+            return private
+
+        monkeypatch.setattr(post_client, '_public_page', public_page)
+        monkeypatch.setattr(post_client, '_private_posts', lambda username, tag: private)
+        monkeypatch.setattr(aio_clients, '_public_page', public_page_async)
+        monkeypatch.setattr(aio_clients, '_private_posts', private_posts_async)
+        return newest_first(public + private)
+    return setup
+
+
+def assert_all_pages(list_posts, expected, page_size):
+    pages = (len(expected) + page_size - 1) // page_size
+    for page in range(1, pages + 2):
+        result = list_posts("alice", "", page, page_size)
+        start = (page - 1) * page_size
+        assert [post.id for post in result['posts']] == [post.id for post in expected[start:start + page_size]], page
+        assert result['total'] == len(expected)
+        assert result['pages'] == pages
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 5, 10])
+def test_private_posts_between_public_ones(feed, list_posts, page_size):
+    public = make_posts(20, 1, created_at=lambda i: f"2024-01-01T00:00:{2 * i:02d}")
+    private = make_posts(7, 100, created_at=lambda i: f"2024-01-01T00:00:{6 * i + 1:02d}", is_private=True)
+
+    assert_all_pages(list_posts, feed(public, private), page_size)
+
+
+@pytest.mark.parametrize("page_size", [2, 5])
+def test_page_boundary_on_public_page_edge(feed, list_posts, page_size):
+    # приватные посты точно на границах публичных страниц
+    public = make_posts(10, 1, created_at=lambda i: f"2024-01-01T00:00:{2 * i:02d}")
+    private = make_posts(3, 100, created_at=lambda i: f"2024-01-01T00:00:{2 * page_size * (i + 1) - 1:02d}", is_private=True)
+
+    assert_all_pages(list_posts, feed(public, private), page_size)
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 4])
+def test_ties_on_created_at(feed, list_posts, page_size):
+    # одинаковый created_at у публичных и приватных постов: порядок решает id
+    public = make_posts(9, 1, created_at=lambda i: f"2024-01-01T00:00:{i // 3:02d}")
+    private = make_posts(4, 1, created_at=lambda i: f"2024-01-01T00:00:{i % 3:02d}", is_private=True)
+    # чётные id у публичных, нечётные у приватных: при равном created_at они чередуются
+    for post in public:
+        post.id *= 2
+    for post in private:
+        post.id = post.id * 4 - 1
+
+    assert_all_pages(list_posts, feed(public, private), page_size)
+
+
+@pytest.mark.parametrize("page_size", [1, 4])
+def test_no_public_posts(feed, list_posts, page_size):
+    private = make_posts(6, 100, is_private=True)
+
+    assert_all_pages(list_posts, feed([], private), page_size)
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 5])
+def test_more_private_than_public(feed, list_posts, page_size):
+    public = make_posts(3, 1, created_at=lambda i: f"2024-01-01T00:00:{10 * i + 5:02d}")
+    private = make_posts(12, 100, created_at=lambda i: f"2024-01-01T00:00:{3 * i:02d}", is_private=True)
+
+    assert_all_pages(list_posts, feed(public, private), page_size)
+
+
+class FakePostService:
+    """ListPosts over in-memory posts; records every request."""
+
+    def __init__(self, public, private, is_async):
+        self.public = newest_first(public)
+        self.private = newest_first(private)
+        self.is_async = is_async
+        self.requests = []
+
+    def _list(self, request):
+        self.requests.append(request)
+        if request.private_only:
+            posts = self.private
+        elif request.username:
+            posts = newest_first(self.public + self.private)
+        else:
+            posts = self.public
+        start = (request.page - 1) * request.page_size
+        return SimpleNamespace(
+            posts=posts[start:start + request.page_size], total=len(posts),
+            pages=(len(posts) + request.page_size - 1) // request.page_size
+        )
+
+    def ListPosts(self, request):
+        if not self.is_async:
+            return self._list(request)
+
+        async def call():
+            return self._list(request)
+        return call()
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_too_many_private_posts_bypass_cache(monkeypatch, is_async):
+    public = make_posts(5, 1, created_at=lambda i: f"2024-01-01T00:00:{2 * i:02d}")
+    private = make_posts(12, 100, created_at=lambda i: f"2024-01-01T00:00:{i:02d}", is_private=True)
+    service = FakePostService(public, private, is_async)
+    cache = post_client.VersionedCache(ttl=60, maxsize=100)
+    module = aio_clients if is_async else post_client
+    monkeypatch.setattr(module, 'MAX_PRIVATE_POSTS', 10)
+    monkeypatch.setattr(module, 'post_list_cache', cache)
+    monkeypatch.setattr(module, 'get_post_client', lambda: service)
+    list_posts = (lambda *args: asyncio.run(aio_clients.list_posts(*args))) if is_async else post_client.list_posts
+
+    result = list_posts("alice", "", 2, 5)
+
+    expected = newest_first(public + private)
+    assert [post.id for post in result['posts']] == [post.id for post in expected[5:10]]
+    assert result['total'] == len(expected)
+    # страница целиком от PostService, без частично загруженных приватных постов
+    assert [(r.private_only, r.username, r.page) for r in service.requests] == [(True, "alice", 1), (False, "alice", 2)]
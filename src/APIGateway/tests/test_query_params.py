@@ -0,0 +1,56 @@
+"""Malformed page/page_size fall back to defaults the same way in the Flask and asyncio gateways."""
+import pytest
+from starlette.testclient import TestClient
+import aio_clients
+import async_gateway
+import gateway
+
+EMPTY_PAGE = {'posts': [], 'total': 0, 'page': 1, 'page_size': 10, 'pages': 0}
+EMPTY_SEARCH = {'posts': [], 'next_cursor': ''}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def list_posts(username, tag, page, page_size):
+        calls.append(('list', page, page_size))
+        return EMPTY_PAGE
+
+    def search_posts(username, query, cursor, page_size):
+        calls.append(('search', page_size))
+        return EMPTY_SEARCH
+
+    async def list_posts_async(*args):
+        return list_posts(*args)
+
+    async def search_posts_async(*args):
+        return search_posts(*args)
+
+    for module in (gateway, async_gateway):
+        monkeypatch.setattr(module, 'get_user_from_token', lambda request: ('alice', 200))
+        monkeypatch.setattr(module, 'send_impression_event', lambda *args: None)
+    monkeypatch.setattr(gateway, 'list_posts', list_posts)
+    monkeypatch.setattr(gateway, 'search_posts', search_posts)
+    monkeypatch.setattr(aio_clients, 'list_posts', list_posts_async)
+    monkeypatch.setattr(aio_clients, 'search_posts', search_posts_async)
+    return calls
+
+
+@pytest.fixture(params=["flask", "async"])
+def client(request):
+    if request.param == "flask":
+        return gateway.app.test_client()
+    return TestClient(async_gateway.app)
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/posts?page=abc&page_size=abc", ('list', 1, 10)),
+    ("/posts?page=2&page_size=", ('list', 2, 10)),
+    ("/posts/search?q=soup&page_size=abc", ('search', 10)),
+])
+def test_malformed_numbers_use_defaults(client, calls, path, expected):
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert calls == [expected]
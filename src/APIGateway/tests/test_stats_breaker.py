@@ -0,0 +1,54 @@
+"""A half-open probe must give its slot back whatever way the call ends."""
+import asyncio
+from concurrent.futures import Future
+import pytest
+import aio_clients
+import statistics_client
+from circuit_breaker import CircuitBreaker, HALF_OPEN
+from proto import statistics_pb2 as pb2
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker('test', open_timeout=0, half_open_calls=1)
+    breaker._open(0)
+    assert breaker.state == HALF_OPEN
+    monkeypatch.setattr(statistics_client, 'stats_breaker', breaker)
+    monkeypatch.setattr(aio_clients, 'stats_breaker', breaker)
+    return breaker
+
+
+def closed_pool():
+    raise RuntimeError("Channel pool is closed")
+
+
+def test_closed_pool_releases_probe(breaker, monkeypatch):
+    monkeypatch.setattr(statistics_client, 'get_statistics_client', closed_pool)
+    with pytest.raises(RuntimeError):
+        statistics_client._call('GetPostStats', pb2.PostIdRequest(post_id=1))
+    assert breaker._probes_in_flight == 0
+
+
+def test_closed_pool_releases_probe_for_future(breaker, monkeypatch):
+    monkeypatch.setattr(statistics_client, 'get_statistics_client', closed_pool)
+    with pytest.raises(RuntimeError):
+        statistics_client._call_future('GetPostStats', pb2.PostIdRequest(post_id=1))
+    assert breaker._probes_in_flight == 0
+
+
+def test_cancelled_future_releases_probe(breaker, monkeypatch):
+    future = Future()
+    method = lambda request, timeout: None
+    method.future = lambda request, timeout: future
+    monkeypatch.setattr(statistics_client, 'get_statistics_client', lambda: type('Stub', (), {'GetPostStats': method}))
+    assert statistics_client._call_future('GetPostStats', pb2.PostIdRequest(post_id=1)) is future
+    assert breaker._probes_in_flight == 1
+    future.cancel()
+    assert breaker._probes_in_flight == 0
+
+
+def test_async_closed_pool_releases_probe(breaker, monkeypatch):
+    monkeypatch.setattr(aio_clients.stats_aio_pool, 'stub', closed_pool)
+    with pytest.raises(RuntimeError):
+        asyncio.run(aio_clients._call('GetPostStats', pb2.PostIdRequest(post_id=1)))
+    assert breaker._probes_in_flight == 0
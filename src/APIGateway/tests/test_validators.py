@@ -0,0 +1,17 @@
+import pytest
+from validators import parse_post_ids
+
+
+def test_parse_post_ids():
+    assert parse_post_ids(["3,1", "2", " 5 ,"], 10) == [3, 1, 2, 5]
+
+
+@pytest.mark.parametrize("values, message", [
+    (["1,abc"], "ids must be comma-separated integers"),
+    ([""], "ids is required"),
+    (["1,2,3"], "Too many ids, max 2"),
+])
+def test_parse_post_ids_errors(values, message):
+    with pytest.raises(ValueError) as error:
+        parse_post_ids(values, 2)
+    assert str(error.value) == message
@@ -0,0 +1,40 @@
+import hashlib
+from datetime import datetime, timezone
+
+def post_etag(post_id, updated_at):
+    return hashlib.sha1(f"{post_id}:{updated_at}".encode('utf-8')).hexdigest()
+
+def post_last_modified(updated_at):
+    # updated_at хранится в UTC без таймзоны, в HTTP-датах точность до секунды
+    return datetime.fromisoformat(updated_at).replace(tzinfo=timezone.utc, microsecond=0)
+
+def is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+    """if_none_match is a werkzeug ETags object, if_modified_since an aware datetime or None."""
+    if if_none_match:
+        # If-None-Match сравнивается слабо (RFC 9110, 13.1.2): W/"x" совпадает с "x"
+        return if_none_match.contains_weak(etag)
+    if if_modified_since:
+        return last_modified <= if_modified_since
+    return False
+
+def parse_int(value, default):
+    # Как request.args.get(..., type=int) во Flask-версии: нечисловое значение заменяется значением по умолчанию
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def parse_flag(value):
+    return (value or '').strip().lower() in ('1', 'true', 'yes')
+
+def parse_post_ids(values, limit):
+    """values are raw ?ids= arguments, each may hold a comma-separated list. Raises ValueError on bad input."""
+    try:
+        post_ids = [int(value) for raw in values for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError("ids must be comma-separated integers") from None
+    if not post_ids:
+        raise ValueError("ids is required")
+    if len(post_ids) > limit:
+        raise ValueError(f"Too many ids, max {limit}")
+    return post_ids
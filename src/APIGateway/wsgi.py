@@ -0,0 +1,10 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the module is imported once in the master, so the public key is read before the
+workers fork. gRPC channels and the Kafka producer are created lazily on first use, i.e. in each
+worker after the fork, because neither survives fork().
+"""
+import auth
+from gateway import app
+
+auth.init_public_key()
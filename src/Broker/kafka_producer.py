@@ -1,16 +1,163 @@
+import atexit
 import json
+import logging
+import os
+import threading
+import time
 from datetime import datetime
 from kafka import KafkaProducer
 
+logger = logging.getLogger('kafka_producer')
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092").split(',')
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", str(64 * 1024)))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip") or None
+KAFKA_MAX_BLOCK_MS = int(os.getenv("KAFKA_MAX_BLOCK_MS", "1000"))
+KAFKA_FLUSH_INTERVAL = float(os.getenv("KAFKA_FLUSH_INTERVAL", "1"))
+KAFKA_SHUTDOWN_TIMEOUT = float(os.getenv("KAFKA_SHUTDOWN_TIMEOUT", "10"))
+# Пока Kafka недоступна, продюсер пересоздаём не чаще раза в KAFKA_RECONNECT_BACKOFF секунд (удваивается до _MAX),
+# а send() в это время сразу считает событие недоставленным
+KAFKA_RECONNECT_BACKOFF = float(os.getenv("KAFKA_RECONNECT_BACKOFF", "1"))
+KAFKA_RECONNECT_BACKOFF_MAX = float(os.getenv("KAFKA_RECONNECT_BACKOFF_MAX", "30"))
+# Старый режим: flush после каждого события
+KAFKA_SYNC_SEND = os.getenv("KAFKA_SYNC_SEND", "false").lower() == "true"
+
 # Создание продюсера
 def get_kafka_producer():
     return KafkaProducer(
-        bootstrap_servers=['kafka:29092'],  # Для сервисов внутри Docker-сети
-        value_serializer=lambda v: json.dumps(v).encode('utf-8')
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,  # Для сервисов внутри Docker-сети
+        value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+        linger_ms=KAFKA_LINGER_MS,
+        batch_size=KAFKA_BATCH_SIZE,
+        compression_type=KAFKA_COMPRESSION,
+        max_block_ms=KAFKA_MAX_BLOCK_MS,
+        acks=1
     )
 
 
-producer = get_kafka_producer()
+class EventProducer:
+    """Non-blocking wrapper: events are batched by KafkaProducer and flushed in the background."""
+
+    def __init__(self, flush_interval=KAFKA_FLUSH_INTERVAL, sync_send=KAFKA_SYNC_SEND,
+                 reconnect_backoff=KAFKA_RECONNECT_BACKOFF, reconnect_backoff_max=KAFKA_RECONNECT_BACKOFF_MAX):
+        self.flush_interval = flush_interval
+        self.sync_send = sync_send
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_backoff_max = reconnect_backoff_max
+        self._producer = None
+        self._flusher = None
+        self._closed = False
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._failure_callbacks = []
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+
+    def _get_producer(self):
+        producer = self._producer
+        if producer is not None:
+            return producer
+        with self._connect_lock:
+            if self._closed:
+                raise RuntimeError("Producer is closed")
+            if self._producer is not None:
+                return self._producer
+            if time.monotonic() < self._retry_at:
+                raise RuntimeError("Kafka is unavailable, producer reconnect is backing off")
+            try:
+                producer = get_kafka_producer()
+            except Exception:
+                self._backoff = min(self._backoff * 2 or self.reconnect_backoff, self.reconnect_backoff_max)
+                self._retry_at = time.monotonic() + self._backoff
+                raise
+            self._backoff = 0.0
+            self._stop.clear()
+            self._producer = producer
+            self._flusher = threading.Thread(target=self._flush_loop, name="kafka-flusher", daemon=True)
+            self._flusher.start()
+        return producer
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            producer = self._producer
+            if self.queued and producer is not None:
+                try:
+                    producer.flush(timeout=self.flush_interval)
+                except Exception as e:
+                    logger.warning(f"Background flush failed: {e}")
+
+    def add_failure_callback(self, callback):
+        self._failure_callbacks.append(callback)
+
+    def _on_success(self, metadata):
+        with self._lock:
+            self.queued -= 1
+            self.sent += 1
+
+    def _on_failure(self, topic, event, exc):
+        with self._lock:
+            self.queued -= 1
+            self.failed += 1
+        logger.error(f"Failed to deliver event to {topic}: {exc}")
+        for callback in self._failure_callbacks:
+            try:
+                callback(topic, event, exc)
+            except Exception as e:
+                logger.error(f"Delivery failure callback raised: {e}")
+
+    def send(self, topic, event):
+        with self._lock:
+            self.queued += 1
+        try:
+            producer = self._get_producer()
+            future = producer.send(topic, event)
+        except Exception as e:
+            self._on_failure(topic, event, e)
+            return
+        future.add_callback(self._on_success)
+        future.add_errback(lambda exc: self._on_failure(topic, event, exc))
+        if self.sync_send:
+            producer.flush()
+
+    def send_many(self, topic, events):
+        for event in events:
+            self.send(topic, event)
+
+    def flush(self, timeout=None):
+        if self._producer is not None:
+            self._producer.flush(timeout=timeout)
+
+    def close(self, timeout=KAFKA_SHUTDOWN_TIMEOUT):
+        # После close() send() не поднимает продюсер и поток flush заново, события считаются недоставленными
+        with self._connect_lock:
+            self._closed = True
+            producer, self._producer = self._producer, None
+        self._stop.set()
+        if producer is not None:
+            try:
+                producer.flush(timeout=timeout)
+            finally:
+                producer.close(timeout=timeout)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'sent': self.sent,
+                'failed': self.failed
+            }
+
+
+producer = EventProducer()
+atexit.register(producer.close)
+
+def get_producer_metrics():
+    return producer.metrics()
 
 # Функции отправки событий
 def send_registration_event(client_id):
@@ -19,7 +166,6 @@ def send_registration_event(client_id):
         'timestamp': datetime.now().isoformat()
     }
     producer.send('registration_events', event)
-    producer.flush()
 
 def send_like_event(client_id, post_id):
     event = {
@@ -29,7 +175,6 @@ def send_like_event(client_id, post_id):
         'timestamp': datetime.now().isoformat()
     }
     producer.send('like_click_events', event)
-    producer.flush()
 
 def send_view_event(client_id, post_id):
     event = {
@@ -39,7 +184,30 @@ def send_view_event(client_id, post_id):
         'timestamp': datetime.now().isoformat()
     }
     producer.send('view_events', event)
-    producer.flush()
+
+def send_view_events(client_id, post_ids):
+    timestamp = datetime.now().isoformat()
+    producer.send_many('view_events', [
+        {
+            'client_id': client_id,
+            'post_id': post_id,
+            'event_type': 'view',
+            'timestamp': timestamp
+        }
+        for post_id in post_ids
+    ])
+
+def send_impression_event(client_id, post_ids):
+    # Одно событие на страницу ленты, на отдельные просмотры его раскладывает StatisticsService
+    if not post_ids:
+        return
+    event = {
+        'client_id': client_id,
+        'post_ids': list(post_ids),
+        'event_type': 'impression',
+        'timestamp': datetime.now().isoformat()
+    }
+    producer.send('impression_events', event)
 
 def send_comment_event(client_id, post_id, comment_id):
     event = {
@@ -50,4 +218,3 @@ def send_comment_event(client_id, post_id, comment_id):
         'timestamp': datetime.now().isoformat()
     }
     producer.send('comment_events', event)
-    producer.flush()
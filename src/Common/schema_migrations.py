@@ -0,0 +1,69 @@
+"""Schema migrations shared by UserService and PostService.
+
+docker-compose mounts this file into the root of each service, next to kafka_producer.py.
+Each service keeps its own MIGRATIONS list and advisory lock id in db/migrations.py.
+"""
+import logging
+import os
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger('migrations')
+
+# Сколько секунд при старте ждать Postgres
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+
+def wait_for_db(engine, timeout=DB_WAIT_TIMEOUT):
+    delay = 0.1
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except OperationalError as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning(f"Waiting for database: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def migrate(engine, migrations, lock_id):
+    """Applies missing migrations under pg_advisory_lock(lock_id), each in its own transaction. Returns applied versions."""
+    applied = []
+    with engine.connect() as conn:
+        # Каждый запрос — в явной транзакции: в SQLAlchemy 2.x execute() сам открывает транзакцию,
+        # и следующий conn.begin() упал бы. Advisory lock сессионный, коммит его не снимает
+        with conn.begin():
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+        try:
+            with conn.begin():
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+                    )
+                """))
+            with conn.begin():
+                done = applied_versions(conn)
+            for version, name, statements in migrations:
+                if version in done:
+                    continue
+                logger.info(f"Applying migration {version}: {name}")
+                with conn.begin():
+                    for statement in statements:
+                        conn.execute(text(statement))
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {"version": version, "name": name}
+                    )
+                applied.append(version)
+        finally:
+            with conn.begin():
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+    return applied
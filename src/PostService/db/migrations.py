@@ -0,0 +1,86 @@
+from schema_migrations import wait_for_db, migrate as apply_migrations
+
+# Номер ключа pg_advisory_lock: несколько реплик не применяют миграции одновременно
+MIGRATIONS_LOCK_ID = 5051
+
+# (версия, описание, SQL). Применённые миграции не меняем, изменения схемы — только новой записью в конце.
+# IF NOT EXISTS в первой миграции подхватывает базы, созданные раньше через create_all.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS posts (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            username VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            is_private BOOLEAN
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tags (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(50) NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS post_tags (
+            post_id INTEGER REFERENCES posts (id),
+            tag_id INTEGER REFERENCES tags (id)
+        )
+        """,
+    ]),
+    (2, "indexes for post lists and tag joins", [
+        # До PK в post_tags могли попасть дубли и NULL
+        "DELETE FROM post_tags WHERE post_id IS NULL OR tag_id IS NULL",
+        """
+        DELETE FROM post_tags a USING post_tags b
+        WHERE a.ctid < b.ctid AND a.post_id = b.post_id AND a.tag_id = b.tag_id
+        """,
+        # PK (post_id, tag_id) обслуживает и выборку тегов поста, и удаление связей
+        "ALTER TABLE post_tags ADD CONSTRAINT post_tags_pkey PRIMARY KEY (post_id, tag_id)",
+        "CREATE INDEX ix_post_tags_tag_id_post_id ON post_tags (tag_id, post_id)",
+        # Публичная лента: порядок индекса совпадает с ORDER BY в list_posts
+        "CREATE INDEX ix_posts_public_created_at ON posts (created_at DESC, id DESC) WHERE is_private = false",
+        # Посты автора (свои приватные и видимые ему)
+        "CREATE INDEX ix_posts_username_created_at ON posts (username, created_at DESC, id DESC)",
+    ]),
+    (3, "post counters", [
+        """
+        CREATE TABLE post_counters (
+            kind VARCHAR(16) NOT NULL,
+            key VARCHAR(50) NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, key)
+        )
+        """,
+        # Пока считаются начальные значения, посты не меняются (реплики старой версии ещё могут писать)
+        "LOCK TABLE posts, post_tags IN SHARE MODE",
+        """
+        INSERT INTO post_counters (kind, key, count)
+        SELECT 'public', '', count(*) FROM posts WHERE is_private = false
+        UNION ALL
+        SELECT 'author_public', username, count(*) FROM posts WHERE is_private = false GROUP BY username
+        UNION ALL
+        SELECT 'author_private', username, count(*) FROM posts WHERE is_private IS NOT false GROUP BY username
+        UNION ALL
+        SELECT 'tag', t.name, count(*)
+        FROM posts p JOIN post_tags pt ON pt.post_id = p.id JOIN tags t ON t.id = pt.tag_id
+        WHERE p.is_private = false GROUP BY t.name
+        """,
+    ]),
+    (4, "full-text search", [
+        # Конфигурация russian стемит и русские, и латинские (english_stem) слова; должна совпадать с SEARCH_CONFIG
+        """
+        ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+        ) STORED
+        """,
+        "CREATE INDEX ix_posts_search_vector ON posts USING GIN (search_vector)",
+    ]),
+]
+
+def migrate(engine, migrations=MIGRATIONS):
+    return apply_migrations(engine, migrations, MIGRATIONS_LOCK_ID)
@@ -1,13 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Table, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Table, ForeignKey, Text, Index, Computed, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from db.db import Base
 
 post_tags = Table(
     'post_tags',
     Base.metadata,
-    Column('post_id', Integer, ForeignKey('posts.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('post_id', Integer, ForeignKey('posts.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id')
 )
 
 class Post(Base):
@@ -20,11 +22,33 @@ class Post(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_private = Column(Boolean, default=False)
+    # Считается самим Postgres при INSERT/UPDATE; в обычные SELECT поста не попадает
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
     
     tags = relationship('Tag', secondary=post_tags, backref='posts')
 
+    # Схему создают миграции (db/migrations.py), индексы здесь повторены для справки
+    __table_args__ = (
+        Index('ix_posts_public_created_at', created_at.desc(), id.desc(), postgresql_where=text('is_private = false')),
+        Index('ix_posts_username_created_at', username, created_at.desc(), id.desc()),
+        Index('ix_posts_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
 class Tag(Base):
     __tablename__ = 'tags'
 
     id = Column(Integer, primary_key=True)
     name = Column(String(50), unique=True, nullable=False)
+
+# Число постов по видимости, тегу и автору (service/counters.py); обновляется в одной транзакции с постом
+post_counters = Table(
+    'post_counters',
+    Base.metadata,
+    Column('kind', String(16), primary_key=True),
+    Column('key', String(50), primary_key=True),
+    Column('count', BigInteger, nullable=False, default=0)
+)
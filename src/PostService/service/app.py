@@ -1,12 +1,15 @@
 import logging
-import time
+import signal
 import grpc
 from concurrent import futures
-from db.db import engine, Base
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+from db.db import engine
+from db.migrations import wait_for_db, migrate
 from proto import post_pb2, post_pb2_grpc
 from service.post_service import PostService
+from service.converters import post_to_proto
 from db.db import SessionLocal
-from service.config import GRPC_HOST, GRPC_PORT
+from service.config import GRPC_HOST, GRPC_PORT, GRPC_SHUTDOWN_GRACE
 from sqlalchemy.exc import SQLAlchemyError
 
 import logging
@@ -35,18 +38,7 @@ class PostServicer(post_pb2_grpc.PostServiceServicer):
                 tags=list(request.tags)
             )
             
-            return post_pb2.PostResponse(
-                post=post_pb2.Post(
-                    id=post.id,
-                    title=post.title,
-                    description=post.description,
-                    username=post.username,
-                    created_at=post.created_at.isoformat(),
-                    updated_at=post.updated_at.isoformat(),
-                    is_private=post.is_private,
-                    tags=[tag.name for tag in post.tags]
-                )
-            )
+            return post_pb2.PostResponse(post=post_to_proto(post))
         except SQLAlchemyError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {str(e)}")
@@ -65,18 +57,7 @@ class PostServicer(post_pb2_grpc.PostServiceServicer):
                 context.set_details("Post not found or access denied")
                 return post_pb2.PostResponse()
             
-            return post_pb2.PostResponse(
-                post=post_pb2.Post(
-                    id=post.id,
-                    title=post.title,
-                    description=post.description,
-                    username=post.username,
-                    created_at=post.created_at.isoformat(),
-                    updated_at=post.updated_at.isoformat(),
-                    is_private=post.is_private,
-                    tags=[tag.name for tag in post.tags]
-                )
-            )
+            return post_pb2.PostResponse(post=post_to_proto(post))
         except SQLAlchemyError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {str(e)}")
@@ -84,6 +65,52 @@ class PostServicer(post_pb2_grpc.PostServiceServicer):
         finally:
             db.close()
     
+    def BatchGetPosts(self, request, context):
+        db = SessionLocal()
+        try:
+            service = PostService(db)
+            posts, missing = service.batch_get_posts(
+                post_ids=list(request.post_ids),
+                username=request.username if request.username else None
+            )
+            
+            return post_pb2.BatchGetPostsResponse(
+                posts=[post_to_proto(post) for post in posts],
+                missing_ids=missing
+            )
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.BatchGetPostsResponse()
+        except SQLAlchemyError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {str(e)}")
+            return post_pb2.BatchGetPostsResponse()
+        finally:
+            db.close()
+    
+    def GetPostVersion(self, request, context):
+        db = SessionLocal()
+        try:
+            service = PostService(db)
+            version = service.get_post_version(post_id=request.post_id, username=request.username)
+            
+            if not version:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details("Post not found or access denied")
+                return post_pb2.PostVersionResponse()
+            
+            return post_pb2.PostVersionResponse(
+                id=version.id,
+                updated_at=version.updated_at.isoformat()
+            )
+        except SQLAlchemyError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {str(e)}")
+            return post_pb2.PostVersionResponse()
+        finally:
+            db.close()
+    
     def UpdatePost(self, request, context):
         db = SessionLocal()
         try:
@@ -102,18 +129,7 @@ class PostServicer(post_pb2_grpc.PostServiceServicer):
                 context.set_details("Post not found or permission denied")
                 return post_pb2.PostResponse()
             
-            return post_pb2.PostResponse(
-                post=post_pb2.Post(
-                    id=post.id,
-                    title=post.title,
-                    description=post.description,
-                    username=post.username,
-                    created_at=post.created_at.isoformat(),
-                    updated_at=post.updated_at.isoformat(),
-                    is_private=post.is_private,
-                    tags=[tag.name for tag in post.tags]
-                )
-            )
+            return post_pb2.PostResponse(post=post_to_proto(post))
         except SQLAlchemyError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {str(e)}")
@@ -147,59 +163,98 @@ class PostServicer(post_pb2_grpc.PostServiceServicer):
                 page=max(1, request.page),
                 page_size=min(100, max(1, request.page_size)),
                 username=request.username if request.username else None,
-                tag=request.tag if request.tag else None
+                tag=request.tag if request.tag else None,
+                private_only=request.private_only,
+                cursor=request.cursor if request.cursor else None,
+                with_total=not request.skip_total
             )
             
-            posts_proto = []
-            for post in result["posts"]:
-                posts_proto.append(post_pb2.Post(
-                    id=post.id,
-                    title=post.title,
-                    description=post.description,
-                    username=post.username,
-                    created_at=post.created_at.isoformat(),
-                    updated_at=post.updated_at.isoformat(),
-                    is_private=post.is_private,
-                    tags=[tag.name for tag in post.tags]
-                ))
-            
             return post_pb2.ListPostsResponse(
-                posts=posts_proto,
+                posts=[post_to_proto(post) for post in result["posts"]],
                 total=result["total"],
                 page=result["page"],
                 page_size=result["page_size"],
-                pages=result["pages"]
+                pages=result["pages"],
+                next_cursor=result["next_cursor"]
             )
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.ListPostsResponse()
         except SQLAlchemyError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {str(e)}")
             return post_pb2.ListPostsResponse()
         finally:
             db.close()
+    
+    def SearchPosts(self, request, context):
+        db = SessionLocal()
+        try:
+            service = PostService(db)
+            result = service.search_posts(
+                query=request.query,
+                page_size=min(100, max(1, request.page_size)),
+                username=request.username if request.username else None,
+                cursor=request.cursor if request.cursor else None
+            )
+            
+            return post_pb2.SearchPostsResponse(
+                posts=[post_to_proto(post) for post in result["posts"]],
+                next_cursor=result["next_cursor"]
+            )
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.SearchPostsResponse()
+        except SQLAlchemyError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {str(e)}")
+            return post_pb2.SearchPostsResponse()
+        finally:
+            db.close()
 
-def create_tables():
-    logging.info("Creating database tables if they don't exist...")
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-    logging.info("Database tables created.")
+SERVICE_NAME = post_pb2.DESCRIPTOR.services_by_name['PostService'].full_name
+
+def prepare_database():
+    logging.info("Waiting for database...")
+    wait_for_db(engine)
+    applied = migrate(engine)
+    logging.info(f"Database is ready, applied migrations: {applied or 'none'}")
 
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
     post_pb2_grpc.add_PostServiceServicer_to_server(PostServicer(), server)
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    for service in ('', SERVICE_NAME):
+        health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
     server.add_insecure_port(f'{GRPC_HOST}:{GRPC_PORT}')
     server.start()
     logging.info(f"gRPC server started at {GRPC_HOST}:{GRPC_PORT}")
-    
+
+    def stop(signum, frame):
+        # Сначала health переходит в NOT_SERVING, затем текущие RPC дорабатывают GRPC_SHUTDOWN_GRACE секунд
+        logging.info("Shutting down Post Service...")
+        health_servicer.enter_graceful_shutdown()
+        server.stop(GRPC_SHUTDOWN_GRACE)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Соединения принимаются сразу, SERVING выставляется только после миграций
     try:
-        while True:
-            time.sleep(69420)
-    except KeyboardInterrupt:
+        prepare_database()
+    except Exception:
         server.stop(0)
+        raise
+    for service in ('', SERVICE_NAME):
+        health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+
+    server.wait_for_termination()
 
 def main():
-    time.sleep(15)
     logging.info("Starting Post Service...")
-    create_tables()
     serve()
 
 if __name__ == "__main__":
@@ -15,3 +15,8 @@ print(DATABASE_URL)
 
 GRPC_HOST = os.getenv("GRPC_HOST", "0.0.0.0")
 GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+
+TAG_CACHE_SIZE = int(os.getenv("TAG_CACHE_SIZE", "10000"))
+
+# Сколько секунд на SIGTERM даётся текущим RPC
+GRPC_SHUTDOWN_GRACE = float(os.getenv("GRPC_SHUTDOWN_GRACE", "10"))
@@ -0,0 +1,13 @@
+from proto import post_pb2
+
+def post_to_proto(post):
+    return post_pb2.Post(
+        id=post.id,
+        title=post.title,
+        description=post.description,
+        username=post.username,
+        created_at=post.created_at.isoformat(),
+        updated_at=post.updated_at.isoformat(),
+        is_private=post.is_private,
+        tags=[tag.name for tag in post.tags]
+    )
@@ -0,0 +1,22 @@
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+# Строки post_counters: (kind, key) -> число постов.
+# Публичным считается пост с is_private = false, приватным — всё остальное, как в list_posts.
+PUBLIC_POSTS = 'public'                  # key = ''
+TAG_POSTS = 'tag'                        # key = имя тега, только публичные посты
+AUTHOR_PUBLIC_POSTS = 'author_public'    # key = username
+AUTHOR_PRIVATE_POSTS = 'author_private'  # key = username
+
+def counter_keys(is_private: Optional[bool], username: str, tags: Iterable[str]) -> List[Tuple[str, str]]:
+    """Counter rows a post in this state adds one to."""
+    if is_private is False:
+        return [(PUBLIC_POSTS, ''), (AUTHOR_PUBLIC_POSTS, username)] + [(TAG_POSTS, name) for name in tags]
+    return [(AUTHOR_PRIVATE_POSTS, username)]
+
+def counter_deltas(before, after):
+    """Non-zero changes between two counter_keys() results, sorted so that concurrent
+    transactions lock counter rows in the same order."""
+    delta = Counter(after)
+    delta.subtract(before)
+    return [{'kind': kind, 'key': key, 'count': count} for (kind, key), count in sorted(delta.items()) if count]
@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+
+# Курсор — позиция последнего отданного поста в порядке (created_at DESC, id DESC),
+# для поиска — (rank DESC, id DESC). Клиенту он непрозрачен, формат можно менять вместе с сервисом.
+
+def _encode(*parts) -> str:
+    raw = '|'.join(str(part) for part in parts).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode(cursor: str):
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8').split('|')
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    return _encode(created_at.isoformat(), post_id)
+
+def decode_cursor(cursor: str):
+    """Returns (created_at, post_id); raises ValueError on a malformed cursor."""
+    try:
+        created_at, post_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+
+def encode_rank_cursor(rank: float, post_id: int) -> str:
+    # repr восстанавливает float без потерь, иначе граница страницы поплывёт
+    return _encode(repr(rank), post_id)
+
+def decode_rank_cursor(cursor: str):
+    """Returns (rank, post_id); raises ValueError on a malformed cursor."""
+    try:
+        rank, post_id = _decode(cursor)
+        return float(rank), int(post_id)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,20 @@
+"""Container healthcheck: exit code 0 when the PostService health service reports SERVING."""
+import os
+import sys
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+
+def main():
+    with grpc.insecure_channel(f"localhost:{GRPC_PORT}") as channel:
+        try:
+            response = health_pb2_grpc.HealthStub(channel).Check(
+                health_pb2.HealthCheckRequest(service='post.PostService'), timeout=2
+            )
+        except grpc.RpcError:
+            return 1
+    return 0 if response.status == health_pb2.HealthCheckResponse.SERVING else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,93 @@
-from sqlalchemy.orm import Session
-from db.models import Post, Tag
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.dialects.postgresql import insert
+from db.models import Post, Tag, post_tags, post_counters
+from sqlalchemy import REAL, cast, func, literal_column, or_, tuple_
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
+from service.config import TAG_CACHE_SIZE
+from service.tag_cache import TagCache
+from service.cursor import encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor
+from service.counters import (
+    counter_keys, counter_deltas, PUBLIC_POSTS, TAG_POSTS, AUTHOR_PRIVATE_POSTS
+)
+
+tag_cache = TagCache(maxsize=TAG_CACHE_SIZE)
+
+# Та же конфигурация, что в выражении posts.search_vector (миграция 4), иначе запрос не совпадёт с лексемами
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+MAX_BATCH_POST_IDS = 500
 
 class PostService:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_post(self, title: str, description: str, username: str, is_private: bool, tags: List[str]):
-        tag_objects = []
-        for tag_name in tags:
-            tag = self.db.query(Tag).filter(Tag.name == tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                self.db.add(tag)
-            tag_objects.append(tag)
+    def _resolve_tag_ids(self, names: List[str]) -> Dict[str, int]:
+        ids = tag_cache.get_many(names)
+        missing = [name for name in names if name not in ids]
+        if not missing:
+            return ids
+        
+        # Новые теги вставляем одним запросом; те, что уже есть (или только что вставлены
+        # параллельной транзакцией), RETURNING не вернёт, их добираем одним SELECT.
+        # Порядок вставки общий для всех транзакций (как в _update_counters), иначе две вставки
+        # одних и тех же новых тегов в разном порядке ждут друг друга и ловят deadlock
+        inserted = self.db.execute(
+            insert(Tag.__table__)
+            .values([{'name': name} for name in sorted(missing)])
+            .on_conflict_do_nothing(index_elements=['name'])
+            .returning(Tag.id, Tag.name)
+        )
+        for tag_id, name in inserted:
+            ids[name] = tag_id
+        
+        existing = [name for name in missing if name not in ids]
+        if existing:
+            for tag_id, name in self.db.query(Tag.id, Tag.name).filter(Tag.name.in_(existing)):
+                ids[name] = tag_id
+        return ids
+    
+    def _set_post_tags(self, post: Post, tags: List[str], replace: bool):
+        # Связи пишем напрямую в post_tags, без загрузки объектов Tag
+        names = list(dict.fromkeys(tags))
+        ids = self._resolve_tag_ids(names)
+        if replace:
+            self.db.execute(post_tags.delete().where(post_tags.c.post_id == post.id))
+        if names:
+            self.db.execute(post_tags.insert(), [{'post_id': post.id, 'tag_id': ids[name]} for name in names])
+        self.db.expire(post, ['tags'])
+        return ids
+    
+    def _update_counters(self, before, after):
+        # Все изменения счётчиков — одним INSERT ... ON CONFLICT в транзакции поста
+        rows = counter_deltas(before, after)
+        if not rows:
+            return
+        stmt = insert(post_counters).values(rows)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=['kind', 'key'],
+            set_={'count': post_counters.c.count + stmt.excluded.count}
+        ))
+    
+    def _visible_total(self, username: Optional[str], tag: Optional[str], private_only: bool, own_private):
+        # Публичные посты и приватные посты автора берутся из post_counters. Счётчика приватных постов
+        # автора по тегу нет: они считаются запросом по индексу автора, таких постов немного
+        keys = []
+        if not private_only:
+            keys.append((TAG_POSTS, tag) if tag else (PUBLIC_POSTS, ''))
+        if own_private is not None and not tag:
+            keys.append((AUTHOR_PRIVATE_POSTS, username))
         
+        total = 0
+        if keys:
+            # sum(bigint) в Postgres — numeric
+            total = int(self.db.query(func.coalesce(func.sum(post_counters.c.count), 0))
+                        .filter(tuple_(post_counters.c.kind, post_counters.c.key).in_(keys)).scalar())
+        if own_private is not None and tag:
+            total += own_private.count()
+        return total
+    
+    def create_post(self, title: str, description: str, username: str, is_private: bool, tags: List[str]):
         post = Post(
             title=title,
             description=description,
@@ -24,14 +95,18 @@ class PostService:
             is_private=is_private
         )
         
-        post.tags = tag_objects
         self.db.add(post)
+        self.db.flush()
+        tag_ids = self._set_post_tags(post, tags, replace=False)
+        self._update_counters([], counter_keys(post.is_private, username, tag_ids))
         self.db.commit()
+        # в кэш попадают только закоммиченные id
+        tag_cache.put_many(tag_ids)
         self.db.refresh(post)
         return post
     
     def get_post(self, post_id: int, username: Optional[str] = None):
-        post = self.db.query(Post).filter(Post.id == post_id).first()
+        post = self.db.query(Post).options(selectinload(Post.tags)).filter(Post.id == post_id).first()
         
         if not post:
             return None
@@ -41,10 +116,39 @@ class PostService:
             
         return post
     
+    def get_post_version(self, post_id: int, username: Optional[str] = None):
+        version = self.db.query(Post.id, Post.updated_at, Post.is_private, Post.username) \
+            .filter(Post.id == post_id).first()
+        
+        if not version:
+            return None
+        
+        if version.is_private and version.username != username:
+            return None
+        
+        return version
+    
+    def batch_get_posts(self, post_ids: List[int], username: Optional[str] = None):
+        """Visible posts in request order (duplicates dropped) and the ids that were not found or are hidden."""
+        post_ids = list(dict.fromkeys(post_ids))
+        if len(post_ids) > MAX_BATCH_POST_IDS:
+            raise ValueError(f"Too many post ids, max {MAX_BATCH_POST_IDS}")
+        if not post_ids:
+            return [], []
+        
+        # Посты одним SELECT ... IN, их теги — вторым; чужие приватные посты неотличимы от несуществующих
+        visible = or_(Post.is_private.isnot(True), Post.username == username) if username else Post.is_private.isnot(True)
+        query = self.db.query(Post).options(selectinload(Post.tags)).filter(Post.id.in_(post_ids), visible)
+        found = {post.id: post for post in query}
+        posts = [found[post_id] for post_id in post_ids if post_id in found]
+        missing = [post_id for post_id in post_ids if post_id not in found]
+        return posts, missing
+    
     def update_post(self, post_id: int, username: str, title: Optional[str] = None, 
                     description: Optional[str] = None, is_private: Optional[bool] = None, 
                     tags: Optional[List[str]] = None):
-        post = self.db.query(Post).filter(Post.id == post_id).first()
+        # FOR UPDATE: счётчики считаются от прежнего состояния поста, его не должен менять параллельный запрос
+        post = self.db.query(Post).filter(Post.id == post_id).with_for_update().first()
         
         if not post:
             return None
@@ -52,6 +156,9 @@ class PostService:
         if post.username != username:
             return None
         
+        tag_names = [tag.name for tag in post.tags]
+        before = counter_keys(post.is_private, post.username, tag_names)
+        
         if title is not None:
             post.title = title
         if description is not None:
@@ -59,23 +166,20 @@ class PostService:
         if is_private is not None:
             post.is_private = is_private
         
+        tag_ids = {}
         if tags is not None:
-            tag_objects = []
-            for tag_name in tags:
-                tag = self.db.query(Tag).filter(Tag.name == tag_name).first()
-                if not tag:
-                    tag = Tag(name=tag_name)
-                    self.db.add(tag)
-                tag_objects.append(tag)
-            post.tags = tag_objects
+            tag_ids = self._set_post_tags(post, tags, replace=True)
+            tag_names = list(tag_ids)
+        self._update_counters(before, counter_keys(post.is_private, post.username, tag_names))
         
         post.updated_at = datetime.utcnow()
         self.db.commit()
+        tag_cache.put_many(tag_ids)
         self.db.refresh(post)
         return post
     
     def delete_post(self, post_id: int, username: str):
-        post = self.db.query(Post).filter(Post.id == post_id).first()
+        post = self.db.query(Post).filter(Post.id == post_id).with_for_update().first()
         
         if not post:
             return False, "Post not found"
@@ -83,29 +187,96 @@ class PostService:
         if post.username != username:
             return False, "You don't have permission to delete this post"
         
+        self._update_counters(counter_keys(post.is_private, post.username, [tag.name for tag in post.tags]), [])
         self.db.delete(post)
         self.db.commit()
         return True, "Post deleted successfully"
     
-    def list_posts(self, page: int, page_size: int, username: Optional[str] = None, tag: Optional[str] = None):
-        query = self.db.query(Post)
+    def list_posts(self, page: int, page_size: int, username: Optional[str] = None, tag: Optional[str] = None,
+                   private_only: bool = False, cursor: Optional[str] = None, with_total: bool = True):
+        def visible(*criteria):
+            query = self.db.query(Post).filter(*criteria)
+            if tag:
+                query = query.join(Post.tags).filter(Tag.name == tag)
+            return query
         
-        if username:
-            query = query.filter(or_(Post.is_private == False, Post.username == username))
+        if private_only:
+            branches = [visible(Post.is_private.isnot(False), Post.username == username)]
+        elif username:
+            # OR двух условий не ложится на один индекс и даёт Seq Scan + Sort всех видимых постов,
+            # поэтому публичные и свои приватные посты читаются отдельными ветками UNION ALL
+            branches = [
+                visible(Post.is_private == False),
+                visible(Post.is_private.isnot(False), Post.username == username)
+            ]
         else:
-            query = query.filter(Post.is_private == False)
+            branches = [visible(Post.is_private == False)]
         
-        if tag:
-            query = query.join(Post.tags).filter(Tag.name == tag)
+        own_private = branches[-1] if private_only or username else None
+        total = self._visible_total(username, tag, private_only, own_private) if with_total else 0
         
-        total = query.count()
+        # id — второй ключ сортировки, без него порядок постов с одинаковым created_at не определён
+        order = (Post.created_at.desc(), Post.id.desc())
+        if cursor:
+            created_at, post_id = decode_cursor(cursor)
+            branches = [branch.filter(tuple_(Post.created_at, Post.id) < tuple_(created_at, post_id)) for branch in branches]
+            offset = 0
+        else:
+            offset = (page - 1) * page_size
         
-        posts = query.order_by(Post.created_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+        # Лишняя строка показывает, есть ли следующая страница
+        limit = page_size + 1
+        if len(branches) == 1:
+            query = branches[0].order_by(*order)
+        else:
+            # Каждая ветка упорядочена и ограничена своим индексом, сверху Merge Append без сортировки всей выборки
+            branches = [branch.order_by(*order).limit(offset + limit) for branch in branches]
+            query = branches[0].union_all(*branches[1:]).order_by(*order)
+        
+        # теги всей страницы — одним SELECT ... IN
+        posts = query.options(selectinload(Post.tags)).offset(offset).limit(limit).all()
+        next_cursor = ""
+        if len(posts) > page_size:
+            posts = posts[:page_size]
+            next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
         
         return {
             "posts": posts,
             "total": total,
             "page": page,
             "page_size": page_size,
-            "pages": (total + page_size - 1) // page_size
+            "pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor
+        }
+    
+    def search_posts(self, query: str, page_size: int, username: Optional[str] = None, cursor: Optional[str] = None):
+        if not query.strip():
+            raise ValueError("Empty search query")
+        
+        # websearch_to_tsquery понимает "фразы", OR и -исключения и не падает на произвольном вводе
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        rank = func.ts_rank(Post.search_vector, tsquery)
+        results = self.db.query(Post, rank).filter(Post.search_vector.op('@@')(tsquery))
+        
+        # Правило видимости как в get_post
+        if username:
+            results = results.filter(or_(Post.is_private.isnot(True), Post.username == username))
+        else:
+            results = results.filter(Post.is_private.isnot(True))
+        
+        if cursor:
+            last_rank, post_id = decode_rank_cursor(cursor)
+            # ts_rank возвращает real: граница сравнивается в том же типе
+            results = results.filter(tuple_(rank, Post.id) < tuple_(cast(last_rank, REAL), post_id))
+        
+        rows = results.options(selectinload(Post.tags)) \
+            .order_by(rank.desc(), Post.id.desc()).limit(page_size + 1).all()
+        next_cursor = ""
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_rank_cursor(rows[-1][1], rows[-1][0].id)
+        
+        return {
+            "posts": [post for post, _ in rows],
+            "next_cursor": next_cursor
         }
@@ -0,0 +1,38 @@
+import threading
+from collections import OrderedDict
+
+
+class TagCache:
+    """LRU of tag name -> id. Tags are never renamed or deleted, so an entry never goes stale."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, names):
+        found = {}
+        with self._lock:
+            for name in names:
+                tag_id = self._entries.get(name)
+                if tag_id is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(name)
+                found[name] = tag_id
+                self.hits += 1
+        return found
+
+    def put_many(self, ids):
+        with self._lock:
+            for name, tag_id in ids.items():
+                self._entries[name] = tag_id
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
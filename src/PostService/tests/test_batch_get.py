@@ -0,0 +1,55 @@
+"""BatchGetPosts: order, missing ids and visibility. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise."""
+import grpc
+import pytest
+from proto import post_pb2
+from service.app import PostServicer
+from service.post_service import MAX_BATCH_POST_IDS
+from conftest import Context
+
+
+@pytest.fixture(scope="module")
+def posts(engine):
+    servicer = PostServicer()
+    created = {}
+    for name, username, is_private in [("a", "alice", False), ("b", "bob", False), ("secret", "alice", True)]:
+        created[name] = servicer.CreatePost(post_pb2.CreatePostRequest(
+            title=name, description="description", username=username, is_private=is_private, tags=[name]
+        ), Context()).post
+    return servicer, created
+
+
+def batch_get(servicer, post_ids, username=""):
+    context = Context()
+    response = servicer.BatchGetPosts(post_pb2.BatchGetPostsRequest(post_ids=post_ids, username=username), context)
+    return response, context
+
+
+def test_request_order_and_missing_ids(posts):
+    servicer, created = posts
+    a, b = created["a"].id, created["b"].id
+
+    response, _ = batch_get(servicer, [b, 999999, a, b])
+
+    assert [post.id for post in response.posts] == [b, a]
+    assert [post.tags for post in response.posts] == [["b"], ["a"]]
+    assert list(response.missing_ids) == [999999]
+
+
+def test_private_posts_only_for_author(posts):
+    servicer, created = posts
+    secret = created["secret"].id
+
+    response, _ = batch_get(servicer, [secret], username="bob")
+    assert not response.posts
+    assert list(response.missing_ids) == [secret]
+
+    response, _ = batch_get(servicer, [secret], username="alice")
+    assert [post.id for post in response.posts] == [secret]
+
+
+def test_too_many_ids(posts):
+    servicer, _ = posts
+
+    _, context = batch_get(servicer, list(range(1, MAX_BATCH_POST_IDS + 2)))
+
+    assert context.code == grpc.StatusCode.INVALID_ARGUMENT
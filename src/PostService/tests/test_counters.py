@@ -0,0 +1,71 @@
+"""post_counters stay equal to COUNT(*) through creates, updates and deletes.
+Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise.
+"""
+import pytest
+from sqlalchemy import text
+from proto import post_pb2
+from service.app import PostServicer
+from conftest import Context, RECOUNT_COUNTERS
+
+@pytest.fixture(scope="module")
+def servicer(engine):
+    return PostServicer()
+
+
+def counters(engine):
+    with engine.connect() as conn:
+        stored = {(kind, key): count for kind, key, count in conn.execute(text("SELECT kind, key, count FROM post_counters"))}
+        expected = {(kind, key): count for kind, key, count in conn.execute(text(RECOUNT_COUNTERS))}
+    return {k: v for k, v in stored.items() if v}, {k: v for k, v in expected.items() if v}
+
+
+def create(servicer, username, is_private=False, tags=()):
+    context = Context()
+    response = servicer.CreatePost(post_pb2.CreatePostRequest(
+        title="title", description="description", username=username, is_private=is_private, tags=list(tags)
+    ), context)
+    assert context.code is None, context.details
+    return response.post
+
+
+def update(servicer, post, is_private, tags=()):
+    context = Context()
+    servicer.UpdatePost(post_pb2.UpdatePostRequest(
+        post_id=post.id, username=post.username, title="title", is_private=is_private, tags=list(tags)
+    ), context)
+    assert context.code is None, context.details
+
+
+def total(servicer, **kwargs):
+    return servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=5, **kwargs), Context()).total
+
+
+def test_counters_follow_changes(engine, servicer):
+    public = create(servicer, "alice", tags=["a", "b", "b"])
+    private = create(servicer, "alice", is_private=True, tags=["a"])
+    other = create(servicer, "bob", tags=["b"])
+
+    update(servicer, public, is_private=True)           # стал приватным, теги не переданы — остаются прежние
+    update(servicer, private, is_private=False, tags=["c"])
+    update(servicer, other, is_private=False, tags=["a", "c"])
+    servicer.DeletePost(post_pb2.DeletePostRequest(post_id=private.id, username="alice"), Context())
+    create(servicer, "carol", tags=["a"])
+
+    stored, expected = counters(engine)
+    assert stored == expected
+
+
+@pytest.mark.parametrize("request_fields", [
+    {},
+    {"tag": "a"},
+    {"username": "alice"},
+    {"username": "alice", "tag": "a"},
+    {"username": "alice", "private_only": True},
+    {"username": "alice", "private_only": True, "tag": "a"},
+])
+def test_total_matches_listed_posts(servicer, request_fields):
+    listed = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=1000, **request_fields), Context())
+    # посты создаёт test_counters_follow_changes: пустой список сравнивал бы 0 с 0
+    assert listed.posts
+
+    assert total(servicer, **request_fields) == len(listed.posts)
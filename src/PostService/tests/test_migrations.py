@@ -0,0 +1,28 @@
+"""Schema migrations. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise."""
+from sqlalchemy import inspect, text
+from db.db import Base
+from db.migrations import MIGRATIONS, migrate
+import db.models  # noqa: F401  регистрирует таблицы в Base.metadata
+
+
+def test_all_migrations_recorded(engine):
+    with engine.connect() as conn:
+        versions = [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_second_run_applies_nothing(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO posts (title, description, username) VALUES ('kept', '', 'author')"))
+
+    assert migrate(engine) == []
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM posts WHERE title = 'kept'")).scalar() == 1
+
+
+def test_schema_matches_models(engine):
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        assert {column.name for column in table.columns} <= columns, table.name
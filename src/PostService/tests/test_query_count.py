@@ -0,0 +1,117 @@
+"""SQL statements issued per RPC. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise.
+
+Run from the PostService directory: python -m pytest tests
+"""
+import pytest
+from sqlalchemy import event
+from proto import post_pb2
+from service.app import PostServicer
+from service.post_service import tag_cache
+from conftest import Context
+
+PAGE_SIZE = 30
+TAGS_PER_POST = 3
+
+
+@pytest.fixture(scope="module")
+def servicer(engine):
+    servicer = PostServicer()
+    for i in range(PAGE_SIZE + 5):
+        servicer.CreatePost(post_pb2.CreatePostRequest(
+            title=f"post {i}",
+            description="description",
+            username="author",
+            tags=[f"tag{(i + j) % 7}" for j in range(TAGS_PER_POST)]
+        ), Context())
+    return servicer
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_list_posts_does_not_load_tags_per_post(servicer, statements):
+    response = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=PAGE_SIZE), Context())
+
+    assert len(response.posts) == PAGE_SIZE
+    assert all(len(post.tags) == TAGS_PER_POST for post in response.posts)
+    # total из post_counters, страница постов, теги страницы
+    assert len(statements) == 3
+
+
+def test_list_posts_visible_to_user(servicer, statements):
+    response = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=PAGE_SIZE, username="author"), Context())
+
+    assert len(response.posts) == PAGE_SIZE
+    # публичные и свои приватные посты — две ветки UNION ALL внутри тех же трёх запросов
+    assert len(statements) == 3
+
+
+def test_list_posts_with_cursor_skips_count(servicer, statements):
+    first = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=10, skip_total=True), Context())
+    assert len(statements) == 2
+
+    statements.clear()
+    second = servicer.ListPosts(post_pb2.ListPostsRequest(
+        page_size=10, cursor=first.next_cursor, skip_total=True
+    ), Context())
+    assert len(statements) == 2
+    assert not {post.id for post in first.posts} & {post.id for post in second.posts}
+
+
+def test_list_posts_by_tag(servicer, statements):
+    response = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=PAGE_SIZE, tag="tag0"), Context())
+
+    assert response.posts
+    assert all("tag0" in post.tags for post in response.posts)
+    assert len(statements) == 3
+
+
+def test_get_post(servicer, statements):
+    post_id = servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=1), Context()).posts[0].id
+    statements.clear()
+
+    response = servicer.GetPost(post_pb2.GetPostRequest(post_id=post_id, username="author"), Context())
+
+    assert len(response.post.tags) == TAGS_PER_POST
+    assert len(statements) == 2
+
+
+def test_batch_get_posts(servicer, statements):
+    post_ids = [post.id for post in servicer.ListPosts(post_pb2.ListPostsRequest(page=1, page_size=PAGE_SIZE), Context()).posts]
+    statements.clear()
+
+    response = servicer.BatchGetPosts(post_pb2.BatchGetPostsRequest(post_ids=post_ids, username="author"), Context())
+
+    assert [post.id for post in response.posts] == post_ids
+    # посты и теги — по одному запросу на весь батч
+    assert len(statements) == 2
+
+
+def test_create_post_resolves_tags_in_bulk(servicer, statements):
+    tag_cache.clear()
+    tags = [f"bulk{i}" for i in range(15)] + ["tag0"]
+
+    response = servicer.CreatePost(post_pb2.CreatePostRequest(
+        title="bulk", description="description", username="author", tags=tags
+    ), Context())
+
+    assert sorted(response.post.tags) == sorted(tags)
+    # INSERT поста, INSERT ... ON CONFLICT тегов, SELECT уже существующего тега,
+    # INSERT связей, счётчики, refresh поста, теги для ответа
+    assert len(statements) == 7
+
+    statements.clear()
+    servicer.CreatePost(post_pb2.CreatePostRequest(
+        title="bulk again", description="description", username="author", tags=tags
+    ), Context())
+    # все теги уже в кэше
+    assert len(statements) == 5
@@ -0,0 +1,132 @@
+"""Query plans on a seeded dataset: no PostService statement may fall back to a sequential scan.
+Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise.
+"""
+import json
+import pytest
+from sqlalchemy import event, text
+from proto import post_pb2
+from service.app import PostServicer
+from conftest import Context, RECOUNT_COUNTERS
+
+POSTS = 20000
+USERS = 500
+TAGS = 5000
+
+
+@pytest.fixture(scope="module")
+def servicer(engine):
+    # Объёмы подобраны так, чтобы планировщик выбирал индекс там, где он есть, а не читал маленькую таблицу целиком
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tags (name) SELECT 'tag' || i FROM generate_series(0, :n - 1) i"), {"n": TAGS})
+        conn.execute(text("""
+            INSERT INTO posts (title, description, username, created_at, updated_at, is_private)
+            SELECT 'post ' || i, 'description', 'user' || (i % :users),
+                   now() - i * interval '1 minute', now(), i % 10 = 0
+            FROM generate_series(1, :n) i
+        """), {"n": POSTS, "users": USERS})
+        conn.execute(text("""
+            INSERT INTO post_tags (post_id, tag_id)
+            SELECT DISTINCT p.id, t.id FROM posts p
+            JOIN tags t ON t.id IN (p.id % :tags + 1, (p.id * 7) % :tags + 1, (p.id * 13) % :tags + 1)
+        """), {"tags": TAGS})
+        conn.execute(text("DELETE FROM post_counters"))
+        conn.execute(text("INSERT INTO post_counters (kind, key, count) " + RECOUNT_COUNTERS))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    return PostServicer()
+
+
+@pytest.fixture
+def seq_scans(engine):
+    """Runs EXPLAIN for every statement issued during the test, yields the list of offending statements."""
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            executed.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    found = []
+    yield found
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    with engine.connect() as conn:
+        for statement, parameters in executed:
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            tables = sorted(seq_scanned_tables(plan[0]["Plan"]))
+            if tables:
+                found.append((tables, " ".join(statement.split())))
+    assert not found, "Seq Scan in:\n" + "\n".join(f"{tables}: {statement}" for tables, statement in found)
+
+
+def seq_scanned_tables(node):
+    if node["Node Type"] == "Seq Scan":
+        yield node["Relation Name"]
+    for child in node.get("Plans", []):
+        yield from seq_scanned_tables(child)
+
+
+def create_post(servicer, username="user1", tags=("tag1", "new tag")):
+    return servicer.CreatePost(post_pb2.CreatePostRequest(
+        title="title", description="description", username=username, tags=list(tags)
+    ), Context()).post
+
+
+def list_posts(servicer, **kwargs):
+    return servicer.ListPosts(post_pb2.ListPostsRequest(page_size=10, **kwargs), Context())
+
+
+def test_create_post(servicer, seq_scans):
+    create_post(servicer)
+
+
+def test_get_post(servicer, seq_scans):
+    post = create_post(servicer)
+    servicer.GetPost(post_pb2.GetPostRequest(post_id=post.id, username="user1"), Context())
+    servicer.GetPostVersion(post_pb2.GetPostRequest(post_id=post.id, username="user1"), Context())
+
+
+def test_update_post(servicer, seq_scans):
+    post = create_post(servicer)
+    servicer.UpdatePost(post_pb2.UpdatePostRequest(
+        post_id=post.id, username="user1", title="updated", tags=["tag2", "tag3"]
+    ), Context())
+
+
+def test_delete_post(servicer, seq_scans):
+    post = create_post(servicer)
+    servicer.DeletePost(post_pb2.DeletePostRequest(post_id=post.id, username="user1"), Context())
+
+
+def test_batch_get_posts(servicer, seq_scans):
+    servicer.BatchGetPosts(post_pb2.BatchGetPostsRequest(post_ids=[5, 1, 12000, 999999], username="user1"), Context())
+
+
+def test_list_public_posts(servicer, seq_scans):
+    first = list_posts(servicer, page=1)
+    list_posts(servicer, page=5)
+    list_posts(servicer, cursor=first.next_cursor)
+
+
+def test_list_posts_visible_to_user(servicer, seq_scans):
+    first = list_posts(servicer, page=1, username="user1")
+    list_posts(servicer, page=5, username="user1")
+    list_posts(servicer, cursor=first.next_cursor, username="user1")
+
+
+def test_list_private_posts(servicer, seq_scans):
+    list_posts(servicer, page=1, username="user1", private_only=True)
+    list_posts(servicer, page=1, username="user1", private_only=True, tag="tag42")
+
+
+def test_list_posts_by_tag(servicer, seq_scans):
+    list_posts(servicer, page=1, tag="tag42")
+    list_posts(servicer, page=1, tag="tag42", username="user1")
+
+
+def test_search_posts(servicer, seq_scans):
+    first = servicer.SearchPosts(post_pb2.SearchPostsRequest(query="12345 or 12346", page_size=1), Context())
+    assert first.next_cursor
+    servicer.SearchPosts(post_pb2.SearchPostsRequest(query="12345 or 12346", username="user1", cursor=first.next_cursor), Context())
@@ -0,0 +1,90 @@
+"""SearchPosts: ranking, visibility and keyset pagination. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise."""
+import grpc
+import pytest
+from proto import post_pb2
+from service.app import PostServicer
+from conftest import Context
+
+
+@pytest.fixture(scope="module")
+def servicer(engine):
+    servicer = PostServicer()
+    posts = [
+        ("Рецепт борща", "Свёкла, капуста и немного укропа", "alice", False),
+        ("Заметки", "Вчера варили борщ на даче", "bob", False),
+        ("Мой секретный борщ", "Никому не показывать", "alice", True),
+        ("Gardening", "Growing beetroots for soup", "bob", False),
+    ]
+    posts += [(f"Борщ номер {i}", "ещё один борщ", "carol", False) for i in range(25)]
+    for title, description, username, is_private in posts:
+        servicer.CreatePost(post_pb2.CreatePostRequest(
+            title=title, description=description, username=username, is_private=is_private
+        ), Context())
+    return servicer
+
+
+def search(servicer, query, username="", cursor="", page_size=10):
+    context = Context()
+    response = servicer.SearchPosts(post_pb2.SearchPostsRequest(
+        query=query, username=username, cursor=cursor, page_size=page_size
+    ), context)
+    return response, context
+
+
+def search_all(servicer, query, username="", page_size=10):
+    found, cursor = [], ""
+    while True:
+        response, _ = search(servicer, query, username, cursor, page_size)
+        found.extend(response.posts)
+        cursor = response.next_cursor
+        if not cursor:
+            return found
+
+
+def test_title_match_ranks_first_and_words_are_stemmed(servicer):
+    response, _ = search(servicer, "борщи", page_size=3)
+
+    # совпадение в заголовке (вес A) выше совпадения только в описании (вес B)
+    assert response.posts[0].title.startswith(("Рецепт", "Борщ"))
+    assert "Заметки" not in [post.title for post in response.posts]
+
+
+def test_english_words_are_stemmed(servicer):
+    response, _ = search(servicer, "beetroot")
+
+    assert [post.title for post in response.posts] == ["Gardening"]
+
+
+def test_private_posts_visible_only_to_author(servicer):
+    anonymous = {post.title for post in search_all(servicer, "секретный")}
+    author = {post.title for post in search_all(servicer, "секретный", username="alice")}
+    other = {post.title for post in search_all(servicer, "секретный", username="bob")}
+
+    assert anonymous == other == set()
+    assert author == {"Мой секретный борщ"}
+
+
+def test_pages_cover_all_results_without_duplicates(servicer):
+    paged = search_all(servicer, "борщ", username="alice", page_size=4)
+    whole, _ = search(servicer, "борщ", username="alice", page_size=100)
+
+    assert [post.id for post in paged] == [post.id for post in whole.posts]
+    assert len(paged) == 28
+
+
+def test_updated_post_is_found_by_new_words(servicer):
+    post = servicer.CreatePost(post_pb2.CreatePostRequest(title="Черновик", description="", username="dave"), Context()).post
+    servicer.UpdatePost(post_pb2.UpdatePostRequest(
+        post_id=post.id, username="dave", title="Окрошка", description="на квасе"
+    ), Context())
+
+    assert [found.id for found in search_all(servicer, "окрошка квас")] == [post.id]
+    assert search_all(servicer, "черновик") == []
+
+
+def test_invalid_input(servicer):
+    _, context = search(servicer, "   ")
+    assert context.code == grpc.StatusCode.INVALID_ARGUMENT
+
+    _, context = search(servicer, "борщ", cursor="not a cursor")
+    assert context.code == grpc.StatusCode.INVALID_ARGUMENT
@@ -0,0 +1,56 @@
+"""Concurrent tag creation. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise."""
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from service.post_service import PostService, tag_cache
+
+TAGS = 20
+
+
+@pytest.fixture
+def slow_tag_inserts(engine):
+    # Каждая вставка тега ждёт 10 мс, чтобы два многострочных INSERT гарантированно шли одновременно
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE FUNCTION slow_tag_insert() RETURNS trigger AS $$
+            BEGIN PERFORM pg_sleep(0.01); RETURN NEW; END $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text("CREATE TRIGGER slow_tag_insert BEFORE INSERT ON tags FOR EACH ROW EXECUTE FUNCTION slow_tag_insert()"))
+    yield
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER slow_tag_insert ON tags"))
+        conn.execute(text("DROP FUNCTION slow_tag_insert()"))
+
+
+def resolve_concurrently(engine, *tag_lists):
+    barrier = threading.Barrier(len(tag_lists))
+    results, errors = [None] * len(tag_lists), []
+
+    def worker(index, names):
+        with Session(engine) as db:
+            try:
+                barrier.wait()
+                results[index] = PostService(db)._resolve_tag_ids(names)
+                db.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=args) for args in enumerate(tag_lists)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_overlapping_new_tags_in_opposite_order(engine, slow_tag_inserts):
+    tag_cache.clear()
+    names = [f"race{i}" for i in range(TAGS)]
+
+    (first, second), errors = resolve_concurrently(engine, names, names[::-1])
+
+    # без общего порядка вставки транзакции ждут строки друг друга и Postgres обрывает одну из них
+    assert not errors
+    assert first == second
+    assert sorted(first) == sorted(names)
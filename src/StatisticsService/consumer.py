@@ -10,46 +10,39 @@ KAFKA_BOOTSTRAP_SERVERS = ['kafka:29092']
 TOPICS = [
     ('view_events', 'view'),
     ('like_click_events', 'like'),
-    ('comment_events', 'comment')
+    ('comment_events', 'comment'),
+    ('impression_events', 'view')
 ]
 
-def process_message(message, event_type, clickhouse_client):
-    try:
-        data = message.value
+def message_to_rows(data, event_type):
+    client_id = data.get('client_id', '')
+    comment_id = data.get('comment_id', None)
+    timestamp = parse_timestamp(data.get('timestamp', ''))
 
-        client_id = data.get('client_id', '')
-        post_id = int(data.get('post_id', 0))
-        comment_id = data.get('comment_id', None)
+    # impression несёт сразу всю страницу ленты, раскладываем на отдельные просмотры
+    if 'post_ids' in data:
+        post_ids = [int(post_id) for post_id in data.get('post_ids') or []]
+    else:
+        post_ids = [int(data.get('post_id', 0))]
 
-        timestamp_str = data.get('timestamp', '')
-        timestamp = parse_timestamp(timestamp_str)
-        logger.info("ok1")
+    return [
+        (event_type, client_id, post_id, comment_id, timestamp)
+        for post_id in post_ids
+    ]
 
-        row = {
-            'event_type': event_type,
-            'client_id': client_id,
-            'post_id': post_id,
-            'comment_id': comment_id,
-            'timestamp': timestamp
-        }
-        logger.info("ok2")
-        logger.info(type(row['post_id']))
+def process_message(message, event_type, clickhouse_client):
+    try:
+        data = message.value
+        rows = message_to_rows(data, event_type)
+        if not rows:
+            return
 
         clickhouse_client.execute(
             '''INSERT INTO events 
                (event_type, client_id, post_id, comment_id, timestamp) VALUES''',
-            [
-                (
-                    row['event_type'],
-                    row['client_id'],
-                    row['post_id'],
-                    row['comment_id'],
-                    row['timestamp']
-                )
-            ]
+            rows
         )
-        logger.info("ok3")
-        logger.info(f"Saved {event_type} event for post {post_id} from user {client_id}")
+        logger.info(f"Saved {len(rows)} {event_type} event(s) from user {data.get('client_id', '')}")
     except Exception as e:
         logger.error(f"Error processing message: {e}")
 
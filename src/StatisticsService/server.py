@@ -11,6 +11,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger('server')
 
 GRPC_PORT = 50052
+MAX_BATCH_POST_IDS = 500
 
 class StatisticsServicer(pb2_grpc.StatisticsServiceServicer):
 
@@ -39,6 +40,41 @@ class StatisticsServicer(pb2_grpc.StatisticsServiceServicer):
             context.set_details(f"Internal error: {e}")
             return pb2.PostStatsResponse()
 
+    def GetPostsStatsBatch(self, request, context):
+        post_ids = list(dict.fromkeys(request.post_ids))
+        if len(post_ids) > MAX_BATCH_POST_IDS:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"Too many post ids, max {MAX_BATCH_POST_IDS}")
+            return pb2.PostsStatsBatchResponse()
+        if not post_ids:
+            return pb2.PostsStatsBatchResponse()
+
+        try:
+            # Один проход по events вместо трёх COUNT(*) на каждый пост
+            query = """
+                SELECT post_id,
+                       countIf(event_type = 'view') AS views,
+                       countIf(event_type = 'like') AS likes,
+                       countIf(event_type = 'comment') AS comments
+                FROM events
+                WHERE post_id IN %(post_ids)s
+                GROUP BY post_id
+            """
+            rows = self.clickhouse.execute(query, {'post_ids': tuple(post_ids)})
+            counts = {post_id: (views, likes, comments) for post_id, views, likes, comments in rows}
+
+            stats = []
+            for post_id in post_ids:
+                views, likes, comments = counts.get(post_id, (0, 0, 0))
+                stats.append(pb2.PostStats(post_id=post_id, views=views, likes=likes, comments=comments))
+
+            return pb2.PostsStatsBatchResponse(stats=stats)
+        except Exception as e:
+            logger.error(f"Error getting batch post stats for {len(post_ids)} posts: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Internal error: {e}")
+            return pb2.PostsStatsBatchResponse()
+
     def GetViewDynamics(self, request, context):
         return self._get_dynamics(request, 'view', context)
 
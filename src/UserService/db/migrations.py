@@ -0,0 +1,47 @@
+from schema_migrations import wait_for_db, migrate as apply_migrations
+
+# Номер ключа pg_advisory_lock: несколько реплик не применяют миграции одновременно
+MIGRATIONS_LOCK_ID = 5001
+
+# (версия, описание, SQL). Применённые миграции не меняем, изменения схемы — только новой записью в конце.
+# IF NOT EXISTS в первой миграции подхватывает базы, созданные раньше через create_all.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS "user" (
+            user_id UUID PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_profile (
+            profile_id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES "user" (user_id),
+            first_name VARCHAR(50) NOT NULL,
+            last_name VARCHAR(50) NOT NULL,
+            birthdate DATE,
+            bio TEXT,
+            phone_number VARCHAR(20)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_relations (
+            user_id UUID NOT NULL REFERENCES "user" (user_id),
+            related_user_id UUID NOT NULL REFERENCES "user" (user_id),
+            relation_type VARCHAR(20) NOT NULL,
+            relation_status VARCHAR(20) NOT NULL,
+            started_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            notes TEXT,
+            PRIMARY KEY (user_id, related_user_id)
+        )
+        """,
+    ]),
+]
+
+def migrate(engine, migrations=MIGRATIONS):
+    return apply_migrations(engine, migrations, MIGRATIONS_LOCK_ID)
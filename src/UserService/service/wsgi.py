@@ -0,0 +1,9 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py service.wsgi:app
+
+With preload_app the module is imported once in the master, so keys are parsed and the schema
+is migrated before the workers fork.
+"""
+from service.auth_service import auth_service as app, load_keys, init_db
+
+load_keys()
+init_db()
@@ -0,0 +1,41 @@
+"""Schema migrations. Needs a Postgres database (TEST_DATABASE_URL), skipped otherwise.
+
+Run from the UserService directory: python -m pytest tests
+"""
+from sqlalchemy import inspect, text
+from db.migrations import MIGRATIONS, migrate
+from db.models import db
+
+
+def test_all_migrations_recorded(engine):
+    with engine.connect() as conn:
+        versions = [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_second_run_applies_nothing(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "user" (user_id, username, email, password_hash)
+            VALUES (gen_random_uuid(), 'kept', 'kept@ya.ru', 'hash')
+        """))
+
+    assert migrate(engine) == []
+
+    with engine.connect() as conn:
+        assert conn.execute(text("""SELECT count(*) FROM "user" WHERE username = 'kept'""")).scalar() == 1
+
+
+def test_migrate_releases_lock(engine):
+    # Повторный запуск в другом соединении не должен висеть на pg_advisory_lock
+    assert migrate(engine) == []
+    with engine.connect() as conn:
+        held = conn.execute(text("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory'")).scalar()
+    assert held == 0
+
+
+def test_schema_matches_models(engine):
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        assert {column.name for column in table.columns} <= columns, table.name
@@ -51,6 +51,15 @@ def test_login_and_access_resource():
     assert whoami_response.status_code == 200
     assert "Hello, accessuser" in whoami_response.text
 
+def test_login_does_not_leak_to_other_clients():
+    requests.post(f"{BASE_URL}/user/signup", json={"username": "leakuser", "password": "leakpass", "email": "leak@ya.ru"})
+    login_response = requests.post(f"{BASE_URL}/user/login", json={"username": "leakuser", "password": "leakpass"})
+    assert login_response.status_code == 200
+
+    # Новый клиент без куки не должен получить чужую сессию через пул соединений шлюза
+    whoami_response = requests.get(f"{BASE_URL}/user/whoami")
+    assert whoami_response.status_code == 401
+
 def test_login_update_and_get_profile():
     signup_response = requests.post(f"{BASE_URL}/user/signup", json={"username": "gooduser", "password": "pass", "email": "good@ya.ru"})
     assert signup_response.status_code == 200
@@ -105,6 +114,22 @@ def test_create_post():
     assert set(data["tags"]) == set(post_data["tags"])
     return data["id"]
 
+def test_create_post_many_tags():
+    new_tag = f"tag_{random_string()}"
+    tags = [f"bulk{i}" for i in range(15)] + [new_tag, "bulk0"]
+    response = requests.post(f"{BASE_URL}/posts", json={
+        "title": f"Tagged Post {random_string()}",
+        "description": "Post with many tags",
+        "tags": tags
+    }, cookies=get_cookie("user1"))
+    assert response.status_code == 201
+    post_id = response.json()["id"]
+    assert sorted(response.json()["tags"]) == sorted(set(tags))
+
+    response = requests.put(f"{BASE_URL}/posts/{post_id}", json={"tags": [new_tag, "bulk3"]}, cookies=get_cookie("user1"))
+    assert response.status_code == 200
+    assert sorted(response.json()["tags"]) == sorted([new_tag, "bulk3"])
+
 def test_get_post():
     post_id = test_create_post()
     response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=get_cookie("user1"))
@@ -187,6 +212,46 @@ def test_filter_by_tag():
     assert any(tag in post["tags"] for post in data["posts"])
 
 
+def test_list_posts_cursor():
+    tag = f"cursor_{random_string()}"
+    for _ in range(3):
+        requests.post(f"{BASE_URL}/posts", json={"title": "Cursor", "description": "d", "tags": [tag]}, cookies=get_cookie("user1"))
+
+    response = requests.get(f"{BASE_URL}/posts?tag={tag}&page_size=10", cookies=get_cookie("user1"))
+    expected = [post["id"] for post in response.json()["posts"]]
+    assert len(expected) == 3
+
+    ids = []
+    cursor = ""
+    while True:
+        response = requests.get(f"{BASE_URL}/posts", params={"tag": tag, "page_size": 2, "cursor": cursor}, cookies=get_cookie("user1"))
+        assert response.status_code == 200
+        data = response.json()
+        assert "total" not in data
+        ids.extend(post["id"] for post in data["posts"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert ids == expected
+
+
+def test_search_posts():
+    word = random_string()
+    public = requests.post(f"{BASE_URL}/posts", json={"title": f"Search {word}", "description": "d"}, cookies=get_cookie("user1")).json()
+    private = requests.post(f"{BASE_URL}/posts", json={"title": "Private", "description": word, "is_private": True}, cookies=get_cookie("user1")).json()
+
+    response = requests.get(f"{BASE_URL}/posts/search", params={"q": word}, cookies=get_cookie("user1"))
+    assert response.status_code == 200
+    # совпадение в заголовке ранжируется выше совпадения в описании
+    assert [post["id"] for post in response.json()["posts"]] == [public["id"], private["id"]]
+
+    response = requests.get(f"{BASE_URL}/posts/search", params={"q": word}, cookies=get_cookie("user2"))
+    assert [post["id"] for post in response.json()["posts"]] == [public["id"]]
+
+    response = requests.get(f"{BASE_URL}/posts/search", cookies=get_cookie("user1"))
+    assert response.status_code == 400
+
+
 def test_get_stats():
     post_id = test_create_post()
 
@@ -198,3 +263,83 @@ def test_get_stats():
 
     data = response.json()
     print(data)
+
+def test_get_posts_stats_batch():
+    first_id = test_create_post()
+    second_id = test_create_post()
+
+    response = requests.get(f"{BASE_URL}/stats/posts?ids={second_id},{first_id}", cookies=get_cookie("user1"))
+    assert response.status_code == 200
+
+    stats = response.json()["stats"]
+    assert [item["post_id"] for item in stats] == [second_id, first_id]
+    assert all(set(item.keys()) == {"post_id", "views", "likes", "comments"} for item in stats)
+
+    response = requests.get(f"{BASE_URL}/stats/posts?ids=abc", cookies=get_cookie("user1"))
+    assert response.status_code == 400
+
+def test_get_feed():
+    post_id = test_create_post()
+
+    response = requests.get(f"{BASE_URL}/feed?page_size=50", cookies=get_cookie("user1"))
+    assert response.status_code == 200
+
+    data = response.json()
+    assert {"posts", "total", "page", "pages", "stats_available"} <= set(data.keys())
+    post = next(post for post in data["posts"] if post["id"] == post_id)
+    if data["stats_available"]:
+        assert set(post["stats"].keys()) == {"views", "likes", "comments"}
+    else:
+        assert post["stats"] is None
+
+def test_get_top_posts_with_bodies():
+    post_id = test_create_post()
+    requests.get(f"{BASE_URL}/posts/{post_id}", cookies=get_cookie("user2"))
+    sleep(1)
+
+    response = requests.get(f"{BASE_URL}/stats/top/posts?metric=view&with_posts=true", cookies=get_cookie("user1"))
+    assert response.status_code == 200
+
+    data = response.json()
+    assert {"metric", "top_posts", "posts_available"} <= set(data.keys())
+    for item in data["top_posts"]:
+        if item["post"] is not None:
+            assert item["post"]["id"] == item["post_id"]
+
+def test_get_post_dashboard():
+    post_id = test_create_post()
+
+    response = requests.get(f"{BASE_URL}/stats/post/{post_id}/dashboard", cookies=get_cookie("user1"))
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["post_id"] == post_id
+    assert set(data["stats"].keys()) == {"views", "likes", "comments"}
+    assert isinstance(data["views"], list)
+    assert isinstance(data["likes"], list)
+    assert isinstance(data["comments"], list)
+
+def test_get_post_conditional():
+    post_id = test_create_post()
+    cookies = get_cookie("user1")
+
+    response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=cookies)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=cookies, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # слабое сравнение: W/"..." совпадает с тем же тегом
+    response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=cookies, headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+    response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=cookies, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    requests.put(f"{BASE_URL}/posts/{post_id}", json={"title": "Changed"}, cookies=cookies)
+    response = requests.get(f"{BASE_URL}/posts/{post_id}", cookies=cookies, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag